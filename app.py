@@ -3,7 +3,6 @@ from ecupath import EventManager
 import time
 
 class App:
-    TESTER_PRESENT = (0x3E, 0x00)
     STOP_MONITORING = False
 
     def __init__(self, interface, tx_id, rx_id, channel, baud_rate, message_type, event_manager: EventManager):
@@ -16,7 +15,6 @@ class App:
         self.event_manager = event_manager
         self.uds = UDS(interface, tx_id, rx_id, channel, baud_rate, message_type, event_manager)
         self.monitoring = False
-        self.sending_tester_present = False
 
     def update_interface(self, interface, tx_id, rx_id, channel, baud_rate, message_type):
         self.stop_interface()  # Stop the current interface before updating
@@ -31,28 +29,24 @@ class App:
     def start_monitoring(self):
         self.monitoring = True
         self.STOP_MONITORING = False
+        self.uds.can_tp.can.start_receiving()
         self.uds.start_session()
         time.sleep(0.01)
+        # Tester present runs on the UDS keep-alive scheduler, so nothing here blocks
         while self.monitoring and not self.STOP_MONITORING:
             self.monitor()
-            self.send_tester_present()
             time.sleep(0.01)
 
     def stop_monitoring(self):
         self.STOP_MONITORING = True
         self.monitoring = False
+        self.uds.keep_alive.stop_all()
+        self.uds.can_tp.can.stop_receiving()
 
     def monitor(self):
-        if not self.sending_tester_present:
-            self.uds.process_request_queue()
-            self.uds.can_tp.cantp_monitor()
-            self.uds.can_tp.can.can_monitor()
-
-    def send_tester_present(self):
-        self.sending_tester_present = True
-        self.uds.send_request(App.TESTER_PRESENT, immediate=True)
-        self.sending_tester_present = False
-        time.sleep(4)
+        self.uds.process_request_queue()
+        self.uds.can_tp.cantp_monitor()
+        self.uds.can_tp.can.can_monitor()
 
     def get_uds(self):
         return self.uds
\ No newline at end of file
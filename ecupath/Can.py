@@ -1,119 +1,278 @@
-from . import Colors
-from .frame import Frame
+from . import log
 from .event_manager import EventManager
 from .Interface import get_hardware_interface
+from .can_frame import CanFrame
+from .bus_monitor import BusMonitor
+import logging
 import queue
+import threading
 
-class Tx:
-    current_instance = None  # Class-level reference to the current instance
+logger = logging.getLogger(__name__)
+
+# Most frames handed to the driver or taken from it in a single call
+BATCH_SIZE = 64
 
+
+class Tx:
     def __init__(self, hardware_interface, tx_id, event_manager):
         self.hardware_interface = hardware_interface
         self.tx_id = tx_id
         self.event_manager = event_manager
-        print(self.tx_id, "txxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-
-        if Tx.current_instance:
-            # Check if tx_id is different and update if necessary
-            if Tx.current_instance.tx_id != tx_id:
-                print("Updating existing Tx instance")
-                Tx.current_instance.update_config(tx_id)
-            else:
-                print("Existing Tx instance already has this tx_id")
-                return  # Skip initialization if tx_id is the same
-        else:
-            # Set the current instance to this instance
-            Tx.current_instance = self
+        self._send_lock = threading.Lock()
+        self.bus_monitor = None
+        logger.debug("Tx created for 0x%X", tx_id)
 
     def call_tx_buffer(self, tx_buffer):
         self._tx_buffer = tx_buffer
 
-    def transmit(self):
-        if not self._tx_buffer.empty():
-            data = self._tx_buffer.get()
-            print(self.tx_id, "txxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-            self.hardware_interface.send_frame(self.tx_id, data)
-            print(f"{Colors.blue}Transmitted : {Frame.hex(data)}{Colors.reset}")
-            self.event_manager.publish('terminal', ['transmitted', data])
+    def transmit(self, max_n=BATCH_SIZE):
+        # Take everything queued so far and hand it to the driver in one call
+        batch = []
+        while len(batch) < max_n:
+            try:
+                batch.append(self._tx_buffer.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
+        self.send_batch([(self.tx_id if tx_id is None else tx_id, data) for tx_id, data, _ in batch])
+        for _, _, on_sent in batch:
+            if on_sent is not None:
+                on_sent()
+
+    def send_batch(self, frames):
+        with self._send_lock:
+            self.hardware_interface.send_frames(frames)
+        for arbitration_id, data in frames:
+            self.sent(arbitration_id, data)
+
+    def send(self, data, tx_id=None):
+        # Also called directly by the consecutive frame scheduler, so guard the hardware handle
+        arbitration_id = self.tx_id if tx_id is None else tx_id
+        with self._send_lock:
+            self.hardware_interface.send_frame(arbitration_id, data)
+        self.sent(arbitration_id, data)
+
+    def sent(self, arbitration_id, data):
+        frame = CanFrame(arbitration_id, data, flags=CanFrame.TX | (CanFrame.FD if self.hardware_interface.is_fd else 0))
+        if self.bus_monitor is not None:
+            self.bus_monitor.record_frame(arbitration_id, len(frame.data))
+        if log.TRACE:
+            log.trace("Transmitted 0x%X: %s", arbitration_id, frame.data)
+        self.event_manager.publish('terminal', ('transmitted', frame))
 
     def update_config(self, tx_id):
         # Update the current instance configuration
         self.tx_id = tx_id
-        print(f"Tx instance updated with new tx_id: {tx_id}")
+        logger.info("Tx instance updated with new tx_id: 0x%X", tx_id)
 
 
 class Rx:
-    current_instance = None  # Class-level reference to the current instance
+    # How long the receive thread blocks in the driver before re-checking its stop flag
+    RECEIVE_TIMEOUT = 0.1
 
     def __init__(self, hardware_interface, rx_id, event_manager):
         self.hardware_interface = hardware_interface
         self.rx_id = rx_id
+        self.rx_ids = {rx_id}
         self.event_manager = event_manager
-
-        if Rx.current_instance:
-            # Check if rx_id is different and update if necessary
-            if Rx.current_instance.rx_id != rx_id:
-                print("Updating existing Rx instance")
-                Rx.current_instance.update_config(rx_id)
-            else:
-                print("Existing Rx instance already has this rx_id")
-                return  # Skip initialization if rx_id is the same
-        else:
-            # Set the current instance to this instance
-            Rx.current_instance = self
+        self._thread = None
+        self._running = False
+        self.bus_monitor = None
 
     def call_rx_buffer(self, rx_buffer):
         self._rx_buffer = rx_buffer
 
     def receive(self):
-        data, id = self.hardware_interface.receive_frame()
+        for frame in self.hardware_interface.receive_frames(BATCH_SIZE):
+            self.handle_frame(frame)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._receive_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _receive_loop(self):
+        # Blocks in the driver instead of polling, so frames reach CAN_TP as soon as they arrive
+        while self._running:
+            try:
+                frames = self.hardware_interface.receive_frames(BATCH_SIZE, self.RECEIVE_TIMEOUT)
+            except Exception as e:
+                logger.error("Error receiving CAN frame: %s", e)
+                continue
+            # Handle the whole burst before going back to the driver
+            for frame in frames:
+                self.handle_frame(frame)
+
+    def handle_frame(self, frame):
+        # A malformed frame or a failing subscriber must not end the receive thread
+        try:
+            self.process_frame(frame)
+        except Exception as e:
+            logger.exception("Error processing CAN frame 0x%X %s: %s", frame.arbitration_id,
+                             bytes(frame.data).hex(' '), e)
 
+    def process_frame(self, frame):
+        data, id = frame.data, frame.arbitration_id
+        if self.bus_monitor is not None:
+            self.bus_monitor.record_frame(id, len(data))
         # TODO: Comment the following 3 lines of code later, it was written to prevent the terminal from getting populated by zero value frames
         # Check if the frame is all zeros
-        if all(byte == 0 for byte in data):
+        if not any(data):
             return  # Ignore the frame and do not print or publish it
 
-        if id == self.rx_id:
-            print(data, "______", id)   # debug line
-            self._rx_buffer.put(data) # this is not being used currently 
-            print(f"{Colors.yellow}Received : {Frame.hex(data)}{Colors.reset}")
-            self.event_manager.publish('data_received', data)
-            self.event_manager.publish('terminal', ['received', data])
+        if id in self.rx_ids:
+            if log.TRACE:
+                log.trace("Received 0x%X: %s", id, data)
+            # The whole frame goes up so CAN_TP and UDS see the hardware receive time
+            self.event_manager.publish('data_received', frame)
+            self.event_manager.publish('terminal', ('received', frame))
 
     def update_config(self, rx_id):
         # Update the current instance configuration
+        self.rx_ids.discard(self.rx_id)
         self.rx_id = rx_id
-        print(f"Rx instance updated with new rx_id: {rx_id}")
+        self.rx_ids.add(rx_id)
+        logger.info("Rx instance updated with new rx_id: 0x%X", rx_id)
+
+    def add_rx_id(self, rx_id):
+        self.rx_ids.add(rx_id)
+
+    def remove_rx_id(self, rx_id):
+        if rx_id != self.rx_id:
+            self.rx_ids.discard(rx_id)
 
 
 class CAN:
+    """
+    Frame I/O on one hardware channel, with its own Tx and its own Rx
+    thread. Open one CAN per channel to drive several buses at once. The
+    events carry no channel, so each channel's stack needs its own
+    EventManager.
+    """
+
     def __init__(self, interface, tx_id, channel, baudrate, msg_type, event_manager: EventManager):
         self.event_manager = event_manager
         self.interface = interface
         self.hardware_interface = get_hardware_interface(interface, channel, baudrate, msg_type)
         self._tx_buffer = queue.Queue()
         self._rx_buffer = queue.Queue()
+        self.rx = None
+        self.rx_ids = set()
+        self.bus_monitor = None
         self.event_manager.subscribe('rx_id', self.get_rx_id)
         self.tx = Tx(self.hardware_interface, tx_id, self.event_manager)
         self.tx.call_tx_buffer(self._tx_buffer)
 
     def update_interface(self, interface, tx_id, channel, baudrate, msg_type):
+        receiving = self.rx is not None and self.rx.running
+        if receiving:
+            self.rx.stop()
+        # The old channel is released first, since PCAN and Vector refuse to open a channel twice
+        self.hardware_interface.close()
         self.interface = interface
         self.hardware_interface = get_hardware_interface(interface, channel, baudrate, msg_type)
+        self.tx.hardware_interface = self.hardware_interface
         self.tx.update_config(tx_id)
-        self.rx.update_config(self.rx_id)
+        if self.rx is not None:
+            self.rx.hardware_interface = self.hardware_interface
+            self.rx.update_config(self.rx_id)
+            self.update_filters()
+            if receiving:
+                self.rx.start()
 
-    def transmit_data(self, data):
-        self._tx_buffer.put(data)
+    def close(self):
+        self.stop_bus_monitor()
+        self.stop_receiving()
+        self.event_manager.unsubscribe('rx_id', self.get_rx_id)
+        self.hardware_interface.close()
+
+    def transmit_data(self, data, tx_id=None, on_sent=None):
+        # on_sent lets the transport layer stop its N_As timer once the frame is on the bus
+        self._tx_buffer.put((tx_id, data, on_sent))
+
+    def transmit_now(self, data, tx_id=None):
+        # Bypasses the tx buffer for frames whose timing matters (paced consecutive frames)
+        self.tx.send(data, tx_id)
 
     def get_rx_id(self, id):
         self.rx_id = id
+        receiving = self.rx is not None and self.rx.running
+        if receiving:
+            self.rx.stop()
         self.rx = Rx(self.hardware_interface, self.rx_id, self.event_manager)
         self.rx.call_rx_buffer(self._rx_buffer)
+        self.rx.bus_monitor = self.bus_monitor
+        for rx_id in self.rx_ids:
+            self.rx.add_rx_id(rx_id)
+        self.update_filters()
+        if receiving:
+            self.rx.start()
+
+    def add_rx_id(self, rx_id):
+        # Extra response IDs for additional ISO-TP channels on the same interface
+        self.rx_ids.add(rx_id)
+        if self.rx is not None:
+            self.rx.add_rx_id(rx_id)
+            self.update_filters()
+
+    def remove_rx_id(self, rx_id):
+        self.rx_ids.discard(rx_id)
+        if self.rx is not None:
+            self.rx.remove_rx_id(rx_id)
+            self.update_filters()
+
+    def update_filters(self):
+        # Keep the hardware acceptance filter in step with the IDs Rx accepts
+        try:
+            self.hardware_interface.set_filters(set(self.rx.rx_ids))
+        except Exception as e:
+            logger.warning("Error setting acceptance filter: %s", e)
+
+    def start_bus_monitor(self, interval=1.0, full_bus=False, bitrate=None):
+        """Starts publishing 'bus_statistics' every `interval` seconds; see BusMonitor."""
+        self.stop_bus_monitor()
+        self.bus_monitor = BusMonitor(self, self.event_manager, interval, full_bus, bitrate)
+        self.tx.bus_monitor = self.bus_monitor
+        if self.rx is not None:
+            self.rx.bus_monitor = self.bus_monitor
+        self.bus_monitor.start()
+        return self.bus_monitor
+
+    def stop_bus_monitor(self):
+        if self.bus_monitor is None:
+            return
+        self.bus_monitor.stop()
+        self.tx.bus_monitor = None
+        if self.rx is not None:
+            self.rx.bus_monitor = None
+        self.bus_monitor = None
+
+    def start_receiving(self):
+        self.rx.start()
+
+    def stop_receiving(self):
+        if self.rx is not None:
+            self.rx.stop()
 
     def can_monitor(self):
-        self.tx.transmit()
-        self.rx.receive()
+        while not self._tx_buffer.empty():
+            self.tx.transmit()
+        # Polling is only the fallback when no receive thread is running
+        if self.rx is not None and not self.rx.running:
+            self.rx.receive()
 
     """ def update_config_details(self, tx_id, rx_id, channel, baudrate, msg_type):
         print(tx_id, rx_id, channel, baudrate, msg_type)
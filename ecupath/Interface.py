@@ -1,133 +1,590 @@
 from abc import ABC, abstractmethod
 from .PCANBasic import *
 from .pcan_constants import *
+from .frame import Frame
+from .can_frame import CanFrame, HardwareClock
+from . import log
 import can
+from collections import deque
+import ctypes
+import logging
+import platform
+import select
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
 
 
 class HardwareInterface(ABC):
+    is_fd = False
+    # Error frames seen (and dropped) by the receive path
+    error_frames = 0
+    # Latest TX/RX error counters reported in an error frame, None until one carries them
+    tx_errors = None
+    rx_errors = None
+
     @abstractmethod
     def send_frame(self, arbitration_id, data):
         pass
 
     @abstractmethod
-    def receive_frame(self):
+    def receive_frame(self, timeout=0):
+        """
+        Returns a CanFrame, or None if nothing arrived within `timeout`
+        seconds. A timeout of 0 never blocks.
+        """
         pass
 
+    def send_frames(self, batch):
+        """Sends every `(arbitration_id, data)` pair in `batch`, in order."""
+        for arbitration_id, data in batch:
+            self.send_frame(arbitration_id, data)
 
-class PCAN(HardwareInterface):
-    current_instance = None  # Class-level reference to the current instance
+    def receive_frames(self, max_n=64, timeout=0):
+        """
+        Returns a list of up to `max_n` CanFrames. Waits
+        up to `timeout` seconds for the first one, then takes whatever else
+        is already queued without blocking.
+        """
+        frames = []
+        frame = self.receive_frame(timeout)
+        while frame is not None:
+            frames.append(frame)
+            if len(frames) >= max_n:
+                break
+            frame = self.receive_frame()
+        return frames
 
-    def __init__(self, channel, baud, message_type):
-        # Check if an instance already exists and update it if necessary
-        if PCAN.current_instance:
-            # If the parameters are different, update the existing instance
-            if (PCAN.current_instance._channel != PCAN_CHANNELS[channel] or
-                    PCAN.current_instance._baudrate != PCAN_BAUD_RATES[baud] or
-                    PCAN.current_instance._message_type != PCAN_MESSAGE_TYPES[message_type]):
-
-                print("Updating existing PCAN instance")
-                PCAN.current_instance.update_config(channel, baud, message_type)
-            else:
-                print("Existing PCAN instance already has these parameters")
-                return  # Skip initialization if parameters are the same
-        else:
-            # Initialize a new instance
-            print(channel, baud, message_type)
-            self.pcan = PCANBasic()  # Initialize the PCANBasic instance
-            self._channel = PCAN_CHANNELS[channel]  # Define the PCAN channel
-            self._baudrate = PCAN_BAUD_RATES[baud]  # Define the baud rate
-            self.pcan_channel = self.pcan.Initialize(self._channel, self._baudrate)  # Initialize the PCAN channel
-            print(self.pcan_channel, "sknfkdnfkhweifokmenfksndjfks")
-            self._message_type = PCAN_MESSAGE_TYPES[message_type]
-
-            # Check for initialization errors
-            if self.pcan_channel != PCAN_ERROR_OK:
-                print("Error initializing PCAN channel:", self.pcan_channel)
-                exit(1)
-            else:
-                print("PCAN channel initialized")
+    def set_filters(self, arbitration_ids):
+        """
+        Restricts reception to `arbitration_ids` in the hardware or driver so
+        other bus traffic never reaches Python. An empty set accepts everything.
+        """
+        pass
 
-            # Set the current instance to this instance
-            PCAN.current_instance = self
+    @property
+    def bitrate(self):
+        """Nominal bitrate in bit/s, or None if it is not known."""
+        try:
+            return int(getattr(self, '_baudrate', None))
+        except (TypeError, ValueError):
+            return None
 
-    def update_config(self, channel, baud, message_type):
-        # Update the current instance configuration
-        self._channel = PCAN_CHANNELS[channel]
-        self._baudrate = PCAN_BAUD_RATES[baud]
+    def bus_status(self):
+        """
+        Returns the controller state ('active', 'warning', 'passive' or
+        'bus_off'; None if unknown) and the TX/RX error counters where the
+        driver reports them.
+        """
+        return {'state': None, 'rx_errors': self.rx_errors, 'tx_errors': self.tx_errors}
+
+    def enable_error_frames(self):
+        pass
+
+    def start_periodic(self, arbitration_id, data, period):
+        """
+        Asks the hardware to transmit `data` every `period` seconds by itself.
+        Returns a task handle, or None if the interface cannot do this.
+        """
+        return None
+
+    def stop_periodic(self, task):
+        pass
+
+    def close(self):
+        pass
+
+
+class PCAN(HardwareInterface):
+    """
+    One PCAN channel (PCAN_USBBUS1, PCAN_USBBUS2, ...). A channel can only
+    be initialised once per process, and two stacks on one channel would
+    split its receive queue and overwrite each other's filters, so
+    `PCAN.open` refuses a channel that is already open.
+    """
+    _open_channels = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, channel, baud, message_type):
+        logger.info("Opening PCAN %s at %s (%s)", channel, baud, message_type)
+        self.pcan = PCANBasic()  # Initialize the PCANBasic instance
+        self._channel = PCAN_CHANNELS[channel]  # Define the PCAN channel
         self._message_type = PCAN_MESSAGE_TYPES[message_type]
-        self.pcan_channel = self.pcan.Initialize(self._channel, self._baudrate)
+        self.is_fd = PCAN.is_fd_message_type(self._message_type)
+        self._baudrate = PCAN.lookup_baud_rate(baud, self.is_fd)  # Define the baud rate
+        self.clock = HardwareClock()
+        self._receive_event = None
+        self.pcan_channel = self.initialize_channel()  # Initialize the PCAN channel
+
+        # Check for initialization errors
         if self.pcan_channel != PCAN_ERROR_OK:
-            print("Error re-initializing PCAN channel:", self.pcan_channel)
-        else:
-            print("PCAN channel re-initialized with new configuration")
+            logger.critical("Error initializing PCAN channel %s: %s", channel, self.pcan_channel)
+            raise ConnectionError(f"Error initializing PCAN channel {channel}: {self.pcan_channel}")
+        logger.info("PCAN channel %s initialized", channel)
+        PCAN._open_channels[self._channel.value] = self
+
+    @classmethod
+    def open(cls, channel, baud, message_type):
+        """Opens `channel`, raising ConnectionError if it is already open."""
+        with cls._registry_lock:
+            if PCAN_CHANNELS[channel].value in cls._open_channels:
+                raise ConnectionError(f"PCAN channel {channel} is already open")
+            return cls(channel, baud, message_type)
+
+    @staticmethod
+    def is_fd_message_type(message_type):
+        return bool(message_type.value & PCAN_MESSAGE_FD.value)
+
+    @staticmethod
+    def lookup_baud_rate(baud, fd):
+        if fd:
+            # Unknown FD keys are passed through as a raw TPCANBitrateFD string
+            return PCAN_FD_BIT_RATES.get(baud, baud.encode() if isinstance(baud, str) else baud)
+        return PCAN_BAUD_RATES[baud]
+
+    def initialize_channel(self):
+        if self.is_fd:
+            return self.pcan.InitializeFD(self._channel, self._baudrate)
+        return self.pcan.Initialize(self._channel, self._baudrate)
+
+    def close(self):
+        with PCAN._registry_lock:
+            self.close_receive_event()
+            self.pcan.Uninitialize(self._channel)
+            if PCAN._open_channels.get(self._channel.value) is self:
+                del PCAN._open_channels[self._channel.value]
 
     def send_frame(self, arbitration_id, data):
+        if self.is_fd:
+            return self.send_frame_fd(arbitration_id, data)
         # Define the CAN message with the specified arbitration ID and data
         frame = TPCANMsg()
         frame.ID = arbitration_id
         frame.MSGTYPE = self._message_type  # Standard frame
         frame.LEN = len(data)  # Length of the data (no of non-zero bytes)
-        frame.DATA = data  # Data (padded with zeros)
+        frame.DATA = tuple(data)  # Data (padded with zeros)
 
         # Transmit the CAN message
         result = self.pcan.Write(self._channel, frame)
         if result != PCAN_ERROR_OK:
-            print("Error transmitting CAN message:", result)
-        else:
-            print("Message transmitted from PCAN")
+            logger.error("Error transmitting CAN message: %s", result)
+        elif log.TRACE:
+            log.trace("Message transmitted from PCAN")
+
+    def send_frame_fd(self, arbitration_id, data):
+        frame = TPCANMsgFD()
+        frame.ID = arbitration_id
+        frame.MSGTYPE = PCAN_MESSAGE_FD.value | PCAN_MESSAGE_BRS.value
+        frame.DLC = Frame.length_to_dlc(len(data))
+        frame.DATA = tuple(data)
 
-    def receive_frame(self):
-        result, msg, timestamp = self.pcan.Read(self._channel)
-        return tuple(msg.DATA), msg.ID
+        result = self.pcan.WriteFD(self._channel, frame)
+        if result != PCAN_ERROR_OK:
+            logger.error("Error transmitting CAN FD message: %s", result)
+        elif log.TRACE:
+            log.trace("Message transmitted from PCAN")
 
+    def set_filters(self, arbitration_ids):
+        if not arbitration_ids:
+            self.pcan.SetValue(self._channel, PCAN_MESSAGE_FILTER, PCAN_FILTER_OPEN)
+            return
+        # Closing first drops the old ranges; each FilterMessages call then widens the filter again
+        self.pcan.SetValue(self._channel, PCAN_MESSAGE_FILTER, PCAN_FILTER_CLOSE)
+        for from_id, to_id in PCAN.id_ranges(arbitration_ids):
+            result = self.pcan.FilterMessages(self._channel, from_id, to_id, PCAN_MODE_STANDARD)
+            if result != PCAN_ERROR_OK:
+                logger.warning("Error setting PCAN acceptance filter: %s", result)
 
-class Vector(HardwareInterface):
-    current_instance = None  # Class-level reference to the current instance
+    @staticmethod
+    def id_ranges(arbitration_ids):
+        ranges = []
+        for arbitration_id in sorted(arbitration_ids):
+            if ranges and arbitration_id == ranges[-1][1] + 1:
+                ranges[-1][1] = arbitration_id
+            else:
+                ranges.append([arbitration_id, arbitration_id])
+        return [tuple(r) for r in ranges]
 
-    def __init__(self, channel, baud, message_type):
-        # Check if an instance already exists and update it if necessary
-        if Vector.current_instance:
-            # If the parameters are different, update the existing instance
-            if (Vector.current_instance._channel != channel or
-                    Vector.current_instance._baudrate != baud or
-                    Vector.current_instance._message_type != message_type):
-
-                print("Updating existing Vector instance")
-                Vector.current_instance.update_config(channel, baud, message_type)
+    def read_frame(self):
+        while True:
+            if self.is_fd:
+                result, msg, timestamp = self.pcan.ReadFD(self._channel)
             else:
-                print("Existing Vector instance already has these parameters")
-                return  # Skip initialization if parameters are the same
+                result, msg, timestamp = self.pcan.Read(self._channel)
+            if result != PCAN_ERROR_OK:
+                return None
+            if msg.MSGTYPE & PCAN_MESSAGE_ERRFRAME.value:
+                self.error_frames += 1
+                # PCAN error frames carry the RX and TX error counters in DATA[2] and DATA[3]
+                self.rx_errors = msg.DATA[2]
+                self.tx_errors = msg.DATA[3]
+                continue
+            if msg.MSGTYPE & PCAN_MESSAGE_STATUS.value:
+                continue
+            if self.is_fd:
+                # FD timestamps are a single microsecond counter
+                flags = CanFrame.FD | (CanFrame.BRS if msg.MSGTYPE & PCAN_MESSAGE_BRS.value else 0)
+                return CanFrame(msg.ID, bytes(msg.DATA[:Frame.dlc_to_length(msg.DLC)]),
+                                self.clock.to_monotonic(timestamp.value / 1000000), flags, msg.DLC)
+            micros = timestamp.micros + 1000 * timestamp.millis + 0x100000000 * 1000 * timestamp.millis_overflow
+            return CanFrame(msg.ID, bytes(msg.DATA[:msg.LEN]), self.clock.to_monotonic(micros / 1000000), 0, msg.LEN)
+
+    @property
+    def bitrate(self):
+        result, value = self.pcan.GetValue(self._channel, PCAN_BUSSPEED_NOMINAL)
+        return value if result == PCAN_ERROR_OK else None
+
+    def bus_status(self):
+        status = self.pcan.GetStatus(self._channel)
+        if status & PCAN_ERROR_BUSOFF:
+            state = 'bus_off'
+        elif status & PCAN_ERROR_BUSPASSIVE:
+            state = 'passive'
+        elif status & (PCAN_ERROR_BUSHEAVY | PCAN_ERROR_BUSLIGHT):
+            state = 'warning'
         else:
-            # Initialize a new instance
-            print(channel, baud, message_type)
-            self.bus = can.interface.Bus(bustype='vector', channel=channel, bitrate=baud)
-            self._channel = channel
-            self._baudrate = baud
-            self._message_type = message_type
+            state = 'active'
+        # GetStatus only says which limit was crossed; the counters come from the last error frame
+        return {'state': state, 'rx_errors': self.rx_errors, 'tx_errors': self.tx_errors}
+
+    def enable_error_frames(self):
+        self.pcan.SetValue(self._channel, PCAN_ALLOW_ERROR_FRAMES, PCAN_PARAMETER_ON)
+
+    def receive_frame(self, timeout=0):
+        frame = self.read_frame()
+        if frame is None and timeout and self.wait_for_receive_event(timeout):
+            frame = self.read_frame()
+        return frame
+
+    def receive_frames(self, max_n=64, timeout=0):
+        frames = self.drain_receive_queue(max_n)
+        if not frames and timeout and self.wait_for_receive_event(timeout):
+            frames = self.drain_receive_queue(max_n)
+        return frames
+
+    def drain_receive_queue(self, max_n):
+        # read_frame returns None once the driver reports PCAN_ERROR_QRCVEMPTY
+        frames = []
+        while len(frames) < max_n:
+            frame = self.read_frame()
+            if frame is None:
+                break
+            frames.append(frame)
+        return frames
+
+    def open_receive_event(self):
+        # The driver signals this event whenever a frame lands in the receive queue
+        if platform.system() == 'Windows':
+            handle = ctypes.windll.kernel32.CreateEventW(None, False, False, None)
+            result = self.pcan.SetValue(self._channel, PCAN_RECEIVE_EVENT, handle)
+        else:
+            # On Linux the driver hands out a file descriptor instead
+            result, handle = self.pcan.GetValue(self._channel, PCAN_RECEIVE_EVENT)
+        if result != PCAN_ERROR_OK:
+            logger.warning("Error setting up PCAN receive event: %s", result)
+            return None
+        return handle
+
+    def close_receive_event(self):
+        if self._receive_event is None:
+            return
+        if platform.system() == 'Windows':
+            self.pcan.SetValue(self._channel, PCAN_RECEIVE_EVENT, 0)
+            ctypes.windll.kernel32.CloseHandle(self._receive_event)
+        self._receive_event = None
+
+    def wait_for_receive_event(self, timeout):
+        if self._receive_event is None:
+            self._receive_event = self.open_receive_event()
+            if self._receive_event is None:
+                return False
+        if platform.system() == 'Windows':
+            return ctypes.windll.kernel32.WaitForSingleObject(self._receive_event, int(timeout * 1000)) == 0
+        readable, _, _ = select.select([self._receive_event], [], [], timeout)
+        return bool(readable)
+
+
+class PythonCanInterface(HardwareInterface):
+    """
+    Frame I/O shared by the backends that sit on a python-can `self.bus`.
+    """
+    def close(self):
+        self.bus.shutdown()
+
+    def send_frame(self, arbitration_id, data):
+        msg = can.Message(arbitration_id=arbitration_id, data=data, is_extended_id=False,
+                          is_fd=self.is_fd, bitrate_switch=self.is_fd)
+        self.bus.send(msg)
+        if log.TRACE:
+            log.trace("Message transmitted from %s", type(self).__name__)
+
+    def send_frames(self, batch):
+        for arbitration_id, data in batch:
+            self.bus.send(can.Message(arbitration_id=arbitration_id, data=data, is_extended_id=False,
+                                      is_fd=self.is_fd, bitrate_switch=self.is_fd))
+        if log.TRACE:
+            log.trace("%d messages transmitted from %s", len(batch), type(self).__name__)
+
+    def start_periodic(self, arbitration_id, data, period):
+        msg = can.Message(arbitration_id=arbitration_id, data=data, is_extended_id=False,
+                          is_fd=self.is_fd, bitrate_switch=self.is_fd)
+        try:
+            return self.bus.send_periodic(msg, period)
+        except (can.CanError, NotImplementedError) as e:
+            logger.info("Cyclic transmission not available: %s", e)
+            return None
+
+    def stop_periodic(self, task):
+        task.stop()
+
+    def set_filters(self, arbitration_ids):
+        filters = [{'can_id': arbitration_id, 'can_mask': 0x7FF, 'extended': False}
+                   for arbitration_id in sorted(arbitration_ids)]
+        self.bus.set_filters(filters or None)
+
+    def receive_frame(self, timeout=0):
+        msg = self.skip_error_frames(self.bus.recv(timeout))
+        if msg is None:
+            return None
+        return self.to_can_frame(msg)
+
+    def skip_error_frames(self, msg):
+        while msg is not None and msg.is_error_frame:
+            self.error_frames += 1
+            self.record_error_frame(msg)
+            msg = self.bus.recv(0)
+        return msg
+
+    def record_error_frame(self, msg):
+        # Error frame payloads are backend specific; SocketCAN overrides this
+        pass
+
+    def bus_status(self):
+        states = {can.BusState.ACTIVE: 'active', can.BusState.PASSIVE: 'passive', can.BusState.ERROR: 'bus_off'}
+        try:
+            state = states.get(self.bus.state)
+        except NotImplementedError:
+            state = None
+        # Only backends whose error frames carry the counters fill them in
+        return {'state': state, 'rx_errors': self.rx_errors, 'tx_errors': self.tx_errors}
+
+    def to_can_frame(self, msg):
+        # python-can reports the driver's receive time on its own clock
+        flags = (CanFrame.FD if msg.is_fd else 0) | (CanFrame.BRS if msg.bitrate_switch else 0)
+        return CanFrame(msg.arbitration_id, bytes(msg.data), self.clock.to_monotonic(msg.timestamp), flags)
+
+    def receive_frames(self, max_n=64, timeout=0):
+        # The first recv blocks in the driver; the rest only empty python-can's receive buffer
+        frames = []
+        msg = self.skip_error_frames(self.bus.recv(timeout))
+        while msg is not None:
+            frames.append(self.to_can_frame(msg))
+            if len(frames) >= max_n:
+                break
+            msg = self.skip_error_frames(self.bus.recv(0))
+        return frames
+
+
+class Vector(PythonCanInterface):
+    """
+    One Vector channel through python-can. As with PCAN, `Vector.open`
+    refuses a channel that is already open instead of sharing it.
+    """
+    FD_DATA_BITRATE = 2000000
+    _open_channels = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, channel, baud, message_type):
+        logger.info("Opening Vector %s at %s (%s)", channel, baud, message_type)
+        self._channel = channel
+        self._baudrate = baud
+        self._message_type = message_type
+        self.clock = HardwareClock()
+        self.bus = self.open_bus()
+        Vector._open_channels[channel] = self
+
+    @classmethod
+    def open(cls, channel, baud, message_type):
+        with cls._registry_lock:
+            if channel in cls._open_channels:
+                raise ConnectionError(f"Vector channel {channel} is already open")
+            return cls(channel, baud, message_type)
+
+    def close(self):
+        with Vector._registry_lock:
+            if Vector._open_channels.get(self._channel) is self:
+                del Vector._open_channels[self._channel]
+            self.bus.shutdown()
+
+    def open_bus(self):
+        self.is_fd = str(self._message_type).lower() == "fd"
+        if self.is_fd:
+            return can.interface.Bus(bustype='vector', channel=self._channel, bitrate=self._baudrate,
+                                     fd=True, data_bitrate=Vector.FD_DATA_BITRATE)
+        return can.interface.Bus(bustype='vector', channel=self._channel, bitrate=self._baudrate)
+
+class SocketCAN(PythonCanInterface):
+    """
+    Linux SocketCAN, including vcan interfaces for testing. The bitrate
+    belongs to the netdev (`ip link set can0 type can bitrate ...`) and is
+    not set through the socket. With `isotp=True`, CAN_TP opens a kernel
+    CAN_ISOTP socket per channel, so segmentation, flow control and STmin
+    pacing happen in the kernel and Python only sees complete payloads.
+    """
+    # linux/can/error.h: the error frame carries TX/RX error counters in data[6]/data[7]
+    CAN_ERR_CNT = 0x200
 
-            # Set the current instance to this instance
-            Vector.current_instance = self
+    def __init__(self, channel, baud=None, message_type="standard", isotp=False):
+        self.isotp = isotp
+        self.clock = HardwareClock()
+        self.bus = None
+        self.update_config(channel, baud, message_type)
+
+    @property
+    def channel(self):
+        return self._channel
+
+    def update_config(self, channel, baud, message_type):
+        if self.bus is not None:
+            self.bus.shutdown()
+        self._channel = channel
+        self._baudrate = baud
+        self._message_type = message_type
+        self.is_fd = str(message_type).lower() == "fd"
+        self.bus = can.interface.Bus(bustype='socketcan', channel=channel, fd=self.is_fd)
+        logger.info("SocketCAN bus opened on %s", channel)
+
+    def record_error_frame(self, msg):
+        if msg.arbitration_id & self.CAN_ERR_CNT and len(msg.data) >= 8:
+            self.tx_errors = msg.data[6]
+            self.rx_errors = msg.data[7]
+
+
+class LoopbackBus:
+    """
+    In-process CAN bus. Every frame sent by one endpoint is appended to the
+    inbox of every other endpoint. Inboxes are deques, whose append/popleft
+    are atomic, so the send path takes no lock; the endpoint list is only
+    replaced (never mutated) when endpoints attach or detach.
+    """
+    _buses = {}
+    _buses_lock = threading.Lock()
+
+    def __init__(self, name):
+        self.name = name
+        self._endpoints = ()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, name):
+        with cls._buses_lock:
+            if name not in cls._buses:
+                cls._buses[name] = cls(name)
+            return cls._buses[name]
+
+    def attach(self, endpoint):
+        with self._lock:
+            # Weak references so an interface dropped by update_interface does not keep collecting frames
+            alive = tuple(ref for ref in self._endpoints if ref() is not None)
+            self._endpoints = alive + (weakref.ref(endpoint),)
+
+    def detach(self, endpoint):
+        with self._lock:
+            self._endpoints = tuple(ref for ref in self._endpoints if ref() not in (None, endpoint))
+
+    def send(self, sender, arbitration_id, data):
+        timestamp = time.monotonic()
+        data = bytes(data)
+        for ref in self._endpoints:
+            endpoint = ref()
+            if endpoint is not None and endpoint is not sender:
+                endpoint.deliver(arbitration_id, data, timestamp)
+
+
+class Loopback(HardwareInterface):
+    """
+    HardwareInterface on a LoopbackBus, for running the tester against a
+    simulated ECU without drivers. `channel` names the bus; interfaces
+    opened on the same channel see each other's frames.
+    """
+    MAX_QUEUED_FRAMES = 65536
+
+    def __init__(self, channel, baud=None, message_type="standard"):
+        self._inbox = deque(maxlen=Loopback.MAX_QUEUED_FRAMES)
+        self._ready = threading.Event()
+        self._filters = None
+        self.bus = None
+        self.update_config(channel, baud, message_type)
 
     def update_config(self, channel, baud, message_type):
-        # Update the current instance configuration
+        if self.bus is not None:
+            self.bus.detach(self)
         self._channel = channel
         self._baudrate = baud
         self._message_type = message_type
-        self.bus = can.interface.Bus(bustype='vector', channel=channel, bitrate=baud)
-        print("Vector channel re-initialized with new configuration")
+        self.is_fd = str(message_type).lower() == "fd"
+        self._inbox.clear()
+        self.bus = LoopbackBus.get(channel)
+        self.bus.attach(self)
+
+    def close(self):
+        self.bus.detach(self)
+
+    def deliver(self, arbitration_id, data, timestamp):
+        filters = self._filters
+        if filters is not None and arbitration_id not in filters:
+            return
+        # The bus stamps frames with time.monotonic() already, so no clock mapping is needed
+        self._inbox.append(CanFrame(arbitration_id, data, timestamp, CanFrame.FD if self.is_fd else 0))
+        self._ready.set()
 
     def send_frame(self, arbitration_id, data):
-        msg = can.Message(arbitration_id=arbitration_id, data=data, is_extended_id=False)
-        self.bus.send(msg)
-        print("Message transmitted from Vector")
+        self.bus.send(self, arbitration_id, data)
+
+    def set_filters(self, arbitration_ids):
+        self._filters = frozenset(arbitration_ids) if arbitration_ids else None
+
+    def bus_status(self):
+        return {'state': 'active', 'rx_errors': 0, 'tx_errors': 0}
+
+    def read_frame(self):
+        try:
+            return self._inbox.popleft()
+        except IndexError:
+            return None
+
+    def receive_frame(self, timeout=0):
+        frame = self.read_frame()
+        if frame is not None or not timeout:
+            return frame
+        # Clear before re-checking so a frame delivered in between still wakes us
+        self._ready.clear()
+        frame = self.read_frame()
+        if frame is None and self._ready.wait(timeout):
+            frame = self.read_frame()
+        return frame
 
-    def receive_frame(self):
-        msg = self.bus.recv()
-        return tuple(msg.data), msg.arbitration_id
+    def receive_frames(self, max_n=64, timeout=0):
+        frames = []
+        frame = self.receive_frame(timeout)
+        while frame is not None:
+            frames.append(frame)
+            if len(frames) >= max_n:
+                break
+            frame = self.read_frame()
+        return frames
 
 
 def get_hardware_interface(choice, *args):
     if choice.lower() == "pcan":
-        return PCAN(*args)
+        return PCAN.open(*args)
     elif choice.lower() == "vector":
-        return Vector(*args)
\ No newline at end of file
+        return Vector.open(*args)
+    elif choice.lower() == "socketcan":
+        return SocketCAN(*args)
+    elif choice.lower() == "socketcan_isotp":
+        return SocketCAN(*args, isotp=True)
+    elif choice.lower() == "loopback":
+        return Loopback(*args)
\ No newline at end of file
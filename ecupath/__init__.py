@@ -3,6 +3,15 @@ from .Can import CAN, Tx, Rx
 from .can_tp import CAN_TP
 from .event_manager import EventManager
 from .frame import Frame
-from .Interface import get_hardware_interface, Vector,PCAN
+from .can_frame import CanFrame
+from .Interface import get_hardware_interface, Vector,PCAN, Loopback
+from .simulated_ecu import SimulatedECU
+from .async_uds import AsyncCAN_TP, AsyncUDSClient
+from .bus_monitor import BusMonitor
+from .request_scheduler import RequestScheduler
+from .did_cache import DidCache
+from .functional import FunctionalClient
+from .dtc_sweep import DtcSweep
 
-__all__ = ['UDS', 'CAN', 'CAN_TP', 'EventManager', 'PCAN','Vector' ,'Frame', 'get_hardware_interface', 'Tx', 'Rx']
\ No newline at end of file
+__all__ = ['UDS', 'CAN', 'CAN_TP', 'EventManager', 'PCAN','Vector' ,'Frame', 'CanFrame', 'get_hardware_interface', 'Tx', 'Rx', 'Loopback', 'SimulatedECU',
+           'AsyncCAN_TP', 'AsyncUDSClient', 'BusMonitor', 'RequestScheduler', 'DidCache', 'FunctionalClient', 'DtcSweep']
\ No newline at end of file
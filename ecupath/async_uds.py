@@ -0,0 +1,299 @@
+from .Interface import PythonCanInterface
+from .UDSException import UDSException
+from .flow_control import get_flow_control_profile
+from .frame import Frame
+from .request_scheduler import response_matches
+import asyncio
+import can
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncIsoTpChannel:
+    """
+    ISO-TP for one (tx_id, rx_id) pair on an asyncio event loop. Frames are
+    fed in by AsyncCAN_TP on the loop, and complete payloads are handed out
+    through `receive()`.
+    """
+    N_As = 1.0
+    N_Bs = 1.0
+    N_Cr = 1.0
+
+    def __init__(self, can_tp, tx_id, rx_id, fc_profile='default'):
+        self.can_tp = can_tp
+        self.tx_id = tx_id
+        self.rx_id = rx_id
+        self.fc_profile = get_flow_control_profile(fc_profile)
+        self.frame = Frame()
+        self._messages = asyncio.Queue()
+        self._flow_control = asyncio.Queue()
+        self._send_lock = asyncio.Lock()
+        self._rx_buffer = None
+        self._rx_length = 0
+        self._rx_sequence_number = 0
+        self._rx_block_count = 0
+        self._last_rx = 0
+
+    @property
+    def tx_dl(self):
+        return self.can_tp.tx_dl
+
+    def feed(self, data):
+        self._last_rx = asyncio.get_running_loop().time()
+        frame_type = data[0] >> 4
+        if frame_type == Frame.SINGLE_FRAME:
+            self._rx_buffer = None
+            self._messages.put_nowait(bytes(Frame.single_frame_payload(data)))
+        elif frame_type == Frame.FIRST_FRAME:
+            if len(data) < Frame.CLASSIC_DL or not Frame.valid_first_frame_length(data, self.frame.extract_length(data)):
+                logger.warning("Ignoring first frame from 0x%X with invalid FF_DL", self.rx_id)
+                return
+            self._rx_length = self.frame.extract_length(data)
+            self._rx_buffer = bytearray(data[Frame.first_frame_header_size(data):])
+            self._rx_sequence_number = 1
+            self.send_flow_control()
+        elif frame_type == Frame.CONSECUTIVE_FRAME and self._rx_buffer is not None:
+            self.append_consecutive_frame(data)
+        elif frame_type == Frame.FLOW_CONTROL_FRAME:
+            self._flow_control.put_nowait(data)
+
+    def append_consecutive_frame(self, data):
+        if data[0] & 0x0F != self._rx_sequence_number:
+            logger.error("Wrong sequence number on 0x%X, dropping message", self.rx_id)
+            self._rx_buffer = None
+            self.fc_profile.record_overrun()
+            return
+        self._rx_sequence_number = (self._rx_sequence_number + 1) & 0x0F
+        self._rx_buffer += bytes(data[1:])
+        if len(self._rx_buffer) >= self._rx_length:
+            self._messages.put_nowait(bytes(self._rx_buffer[:self._rx_length]))
+            self._rx_buffer = None
+            return
+        self._rx_block_count -= 1
+        if self._rx_block_count == 0:
+            self.send_flow_control()
+
+    def send_flow_control(self):
+        self._rx_block_count = self.fc_profile.block_size
+        self.can_tp.send_frame(self.tx_id, self.frame.construct_flow_control(self.fc_profile.block_size,
+                                                                             self.fc_profile.stmin))
+
+    def send_frame(self, frame):
+        # The driver call returns once the frame is handed over, so N_As bounds how long that took
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self.can_tp.send_frame(self.tx_id, frame)
+        if loop.time() - started > self.N_As:
+            raise TimeoutError(f"N_As timeout sending to 0x{self.tx_id:X}")
+
+    async def receive(self, timeout=None):
+        # `timeout` covers the start of the message; once a multi-frame message
+        # is arriving it only has to keep to N_Cr between consecutive frames
+        get = asyncio.ensure_future(self._messages.get())
+        wait = timeout
+        try:
+            while True:
+                done, _ = await asyncio.wait({get}, timeout=wait)
+                if done:
+                    return get.result()
+                idle = asyncio.get_running_loop().time() - self._last_rx
+                if self._rx_buffer is None or idle >= self.N_Cr:
+                    # A late remainder of this message must not complete as the next one
+                    self._rx_buffer = None
+                    raise asyncio.TimeoutError()
+                wait = self.N_Cr - idle
+        finally:
+            get.cancel()
+
+    def clear(self):
+        self._rx_buffer = None
+        while not self._messages.empty():
+            self._messages.get_nowait()
+
+    async def send(self, data):
+        data = memoryview(bytes(data))
+        async with self._send_lock:
+            if len(data) <= Frame.max_single_frame_length(self.tx_dl):
+                self.send_frame(Frame.construct_single_frame(data))
+                return
+            while not self._flow_control.empty():
+                self._flow_control.get_nowait()
+            first_frame = Frame.construct_first_frame(len(data), data, self.tx_dl)
+            offset = len(first_frame) - Frame.first_frame_header_size(first_frame)
+            self.send_frame(first_frame)
+            cf_size = self.tx_dl - 1
+            sequence_number = 1
+            while offset < len(data):
+                block_size, stmin = await self.wait_for_flow_control()
+                sent = 0
+                while offset < len(data) and (block_size == 0 or sent < block_size):
+                    if sent:
+                        # Sub-millisecond STmin still yields, so other conversations keep moving
+                        await asyncio.sleep(stmin)
+                    chunk = data[offset:offset + cf_size]
+                    self.send_frame(Frame.construct_consecutive_frame(sequence_number, chunk))
+                    offset += len(chunk)
+                    sequence_number = (sequence_number + 1) & 0x0F
+                    sent += 1
+
+    async def wait_for_flow_control(self):
+        while True:
+            try:
+                frame = await asyncio.wait_for(self._flow_control.get(), self.N_Bs)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"N_Bs timeout waiting for flow control on 0x{self.rx_id:X}")
+            flow_status = frame[0] & 0x0F
+            if flow_status == Frame.FC_CONTINUE_TO_SEND:
+                return frame[1], Frame.decode_stmin(frame[2])
+            if flow_status == Frame.FC_OVERFLOW:
+                raise OverflowError(f"Receiver on 0x{self.rx_id:X} reported overflow")
+            # FC_WAIT: the receiver restarts N_Bs with every wait frame
+
+
+class AsyncCAN_TP:
+    """
+    Routes frames from one hardware interface to AsyncIsoTpChannels on the
+    running event loop. python-can buses are read through a Notifier and an
+    AsyncBufferedReader. Other interfaces get a single reader thread that
+    hands each burst to the loop, so there is never a thread per request.
+    """
+    RECEIVE_TIMEOUT = 0.1
+
+    def __init__(self, hardware_interface):
+        self.hardware_interface = hardware_interface
+        self.tx_dl = Frame.FD_DL if hardware_interface.is_fd else Frame.CLASSIC_DL
+        self.channels = {}
+        self._rx_routes = {}
+        self._loop = None
+        self._notifier = None
+        self._reader_task = None
+        self._thread = None
+        self._running = False
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._running = True
+        if isinstance(self.hardware_interface, PythonCanInterface):
+            reader = can.AsyncBufferedReader()
+            self._notifier = can.Notifier(self.hardware_interface.bus, [reader], loop=self._loop)
+            self._reader_task = asyncio.create_task(self._read_notifier(reader))
+        else:
+            self._thread = threading.Thread(target=self._read_interface, daemon=True)
+            self._thread.start()
+
+    async def stop(self):
+        self._running = False
+        if self._notifier is not None:
+            self._notifier.stop()
+            self._notifier = None
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._thread is not None:
+            await self._loop.run_in_executor(None, self._thread.join)
+            self._thread = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _read_notifier(self, reader):
+        async for msg in reader:
+            self.dispatch(msg.arbitration_id, msg.data)
+
+    def _read_interface(self):
+        while self._running:
+            frames = self.hardware_interface.receive_frames(64, self.RECEIVE_TIMEOUT)
+            if frames:
+                self._loop.call_soon_threadsafe(self.dispatch_frames, frames)
+
+    def dispatch_frames(self, frames):
+        for frame in frames:
+            self.dispatch(frame.arbitration_id, frame.data)
+
+    def dispatch(self, arbitration_id, data):
+        channel = self._rx_routes.get(arbitration_id)
+        if channel is not None and data:
+            channel.feed(data)
+
+    def open_channel(self, tx_id, rx_id, fc_profile='default'):
+        channel = AsyncIsoTpChannel(self, tx_id, rx_id, fc_profile)
+        self.channels[(tx_id, rx_id)] = channel
+        self._rx_routes[rx_id] = channel
+        self.hardware_interface.set_filters(set(self._rx_routes))
+        return channel
+
+    def close_channel(self, tx_id, rx_id):
+        channel = self.channels.pop((tx_id, rx_id), None)
+        if channel is not None and self._rx_routes.get(rx_id) is channel:
+            del self._rx_routes[rx_id]
+            self.hardware_interface.set_filters(set(self._rx_routes))
+
+    def send_frame(self, tx_id, frame):
+        self.hardware_interface.send_frame(tx_id, frame)
+
+
+class AsyncUDSClient:
+    """
+    asyncio UDS client for one ECU, e.g. `await client.request(0x22, b'\\xF1\\x90')`.
+    Returns the positive response bytes or raises the UDSException for the
+    NRC. Requests to one ECU are serialised as UDS requires; use one client
+    per ECU and gather them to talk to many ECUs at once.
+    """
+
+    def __init__(self, can_tp, tx_id, rx_id, p2_timer=0.05, p2_star_timer=5, fc_profile='default'):
+        self.can_tp = can_tp
+        self.channel = can_tp.open_channel(tx_id, rx_id, fc_profile)
+        self.p2_timer = p2_timer
+        self.p2_star_timer = p2_star_timer
+        self._lock = asyncio.Lock()
+
+    async def request(self, sid, data=b'', timeout=None):
+        payload = bytes((sid,)) + bytes(data)
+        async with self._lock:
+            self.channel.clear()
+            await self.channel.send(payload)
+            wait = self.p2_timer if timeout is None else timeout
+            while True:
+                try:
+                    response = await self.channel.receive(wait)
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"No response to 0x{sid:02X} within {wait}s")
+                # Matched like the sync path, so a late answer to another sub-function or DID is skipped
+                if not response_matches(payload, response):
+                    logger.debug("Ignoring response %s to another request", response.hex(' '))
+                    continue
+                if response[0] == 0x7F:
+                    if len(response) >= 3 and response[2] == 0x78:
+                        # Response pending: the ECU now has P2* to answer
+                        wait = self.p2_star_timer
+                        continue
+                    raise UDSException.create_exception(response[2])
+                if sid == 0x10 and len(response) >= 6:
+                    self.update_timers(response)
+                return response
+
+    def update_timers(self, response):
+        self.p2_timer = (response[2] << 8 | response[3]) / 1000
+        self.p2_star_timer = (response[4] << 8 | response[5]) / 1000
+
+    async def start_session(self, session=0x03):
+        return await self.request(0x10, bytes((session,)))
+
+    async def read_data_by_identifier(self, did):
+        response = await self.request(0x22, did.to_bytes(2, 'big'))
+        return response[3:]
+
+    async def write_data_by_identifier(self, did, value):
+        return await self.request(0x2E, did.to_bytes(2, 'big') + bytes(value))
+
+    async def tester_present(self):
+        await self.channel.send(bytes((0x3E, 0x80)))
+
+    def close(self):
+        self.can_tp.close_channel(self.channel.tx_id, self.channel.rx_id)
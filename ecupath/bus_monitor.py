@@ -0,0 +1,108 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BusMonitor:
+    """
+    Background sampler for bus health. The receive and transmit paths call
+    `record_frame` for every frame (a dict update under a lock). Once per
+    `interval` the sampler publishes a 'bus_statistics' event with:
+    - bus load %
+    - frames per second per ID
+    - error frames
+    - the controller state and error counters
+
+    It also publishes 'bus_state_changed' whenever the controller moves
+    between active, warning, error-passive and bus-off.
+
+    Load only counts frames that reach the host. With the acceptance filter
+    installed, that is our diagnostic traffic. `full_bus=True` opens the
+    filter so the whole bus is counted, at the cost of receiving every frame.
+    """
+
+    def __init__(self, can, event_manager, interval=1.0, full_bus=False, bitrate=None):
+        self.can = can
+        self.event_manager = event_manager
+        self.interval = interval
+        self.full_bus = full_bus
+        self._bitrate = bitrate
+        self._lock = threading.Lock()
+        self._frame_counts = {}
+        self._bits = 0
+        self._error_frames = 0
+        self._state = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_statistics = None
+
+    @property
+    def bitrate(self):
+        return self._bitrate or self.can.hardware_interface.bitrate
+
+    @staticmethod
+    def frame_bits(length):
+        # 11-bit data frame: 47 bits of framing plus the payload, with worst-case bit stuffing
+        return 47 + 8 * length + (34 + 8 * length - 1) // 4
+
+    def record_frame(self, arbitration_id, length):
+        with self._lock:
+            self._frame_counts[arbitration_id] = self._frame_counts.get(arbitration_id, 0) + 1
+            self._bits += self.frame_bits(length)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.can.hardware_interface.enable_error_frames()
+        if self.full_bus:
+            self.can.hardware_interface.set_filters(set())
+        self._error_frames = self.can.hardware_interface.error_frames
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+        if self.full_bus:
+            self.can.update_filters()
+
+    def _run(self):
+        started = time.monotonic()
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            try:
+                self.sample(now - started)
+            except Exception as e:
+                logger.error("Bus monitor sample failed: %s", e)
+            started = now
+
+    def sample(self, elapsed):
+        with self._lock:
+            counts, self._frame_counts = self._frame_counts, {}
+            bits, self._bits = self._bits, 0
+        interface = self.can.hardware_interface
+        status = interface.bus_status()
+        error_frames = interface.error_frames - self._error_frames
+        self._error_frames = interface.error_frames
+        bitrate = self.bitrate
+        statistics = {
+            'load': 100 * bits / (bitrate * elapsed) if bitrate and elapsed else None,
+            'frames_per_second': {arbitration_id: count / elapsed for arbitration_id, count in counts.items()},
+            'error_frames': error_frames,
+            'state': status['state'],
+            'rx_errors': status['rx_errors'],
+            'tx_errors': status['tx_errors']
+        }
+        if status['state'] != self._state:
+            if self._state is not None:
+                logger.warning("Bus state changed: %s -> %s", self._state, status['state'])
+                self.event_manager.publish('bus_state_changed', {'old': self._state, 'new': status['state']})
+            self._state = status['state']
+        self.last_statistics = statistics
+        self.event_manager.publish('bus_statistics', statistics)
+        return statistics
@@ -0,0 +1,72 @@
+from .frame import Frame
+import time
+
+
+class CanFrame:
+    """
+    One CAN frame as it moves through the interfaces, Tx, Rx, CAN_TP and the
+    'data_received'/'terminal' events. `data` is the payload as bytes and
+    `timestamp` is on time.monotonic(); received frames carry the hardware
+    receive time mapped onto that clock. Slots keep each frame to a single
+    small object with no per-instance dict, which matters for long captures.
+    """
+    __slots__ = ('arbitration_id', 'dlc', 'data', 'timestamp', 'flags')
+
+    # Bits in `flags`
+    FD = 0x01
+    BRS = 0x02
+    TX = 0x04
+
+    def __init__(self, arbitration_id, data, timestamp=None, flags=0, dlc=None):
+        self.arbitration_id = arbitration_id
+        self.data = data if type(data) is bytes else bytes(data)
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self.flags = flags
+        self.dlc = Frame.length_to_dlc(len(self.data)) if dlc is None else dlc
+
+    @property
+    def is_fd(self):
+        return bool(self.flags & CanFrame.FD)
+
+    @property
+    def is_tx(self):
+        return bool(self.flags & CanFrame.TX)
+
+    def __eq__(self, other):
+        if not isinstance(other, CanFrame):
+            return NotImplemented
+        return (self.arbitration_id, self.data, self.flags) == (other.arbitration_id, other.data, other.flags)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"CanFrame(0x{self.arbitration_id:X}, {self.data.hex(' ')}, dlc={self.dlc}, flags=0x{self.flags:X})"
+
+
+class HardwareClock:
+    """
+    Maps a device's free-running receive timestamps (in seconds) onto
+    time.monotonic(). Every frame reaches the host some time after the
+    hardware stamped it, so the smallest host-minus-hardware difference seen
+    is the best offset estimate. The estimate restarts from the best sample
+    of each window so that drift between the two clocks is tracked.
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._offset = None
+        self._window_offset = None
+        self._samples = 0
+
+    def to_monotonic(self, hardware_time):
+        offset = time.monotonic() - hardware_time
+        if self._window_offset is None or offset < self._window_offset:
+            self._window_offset = offset
+        if self._offset is None or offset < self._offset:
+            self._offset = offset
+        self._samples += 1
+        if self._samples >= self.window:
+            self._offset = self._window_offset
+            self._window_offset = None
+            self._samples = 0
+        return hardware_time + self._offset
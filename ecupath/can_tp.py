@@ -1,152 +1,541 @@
 from .Can import CAN
 from .event_manager import EventManager
 from .frame import Frame
+from .cf_scheduler import ConsecutiveFrameScheduler
+from .flow_control import get_flow_control_profile
+from .isotp_socket import IsoTpSocketChannel
+from .timer_wheel import TimerWheel
+from . import log
+import logging
 import queue
 import threading
+import time
 
-class CAN_TP:
-    def __init__(self, interface, tx_id, channel, baud_rate, message_type, event_manager: EventManager) -> None:
-        self.event_manager = event_manager
-        self.interface = interface
-        self.can = CAN(interface, tx_id, channel, baud_rate, message_type, event_manager)
-        self.event_manager.subscribe('data_received', self.get_data)
-        self.store_data = []
-        self._buffer_to_can = queue.Queue()
-        self._buffer_from_uds = queue.Queue()
+logger = logging.getLogger(__name__)
+
+
+class IsoTpChannel:
+    """
+    Segmentation and reassembly state for one (tx_id, rx_id) address pair.
+    """
+    # Escape-sequence FFs can announce up to 4 GiB, so large receive buffers
+    # start at this size and grow as consecutive frames actually arrive.
+    RX_PREALLOC_LIMIT = 0x10000
+    # ISO 15765-2 network layer timeouts in seconds
+    N_As = 1.0
+    N_Bs = 1.0
+    N_Cr = 1.0
+
+    def __init__(self, can_tp, tx_id, rx_id, on_message, fc_profile='default'):
+        self.can_tp = can_tp
+        self.tx_id = tx_id
+        self.rx_id = rx_id
+        self.on_message = on_message
         self.frame = Frame()
+        self.timer_wheel = can_tp.timer_wheel
+        self._lock = threading.RLock()
+        self.store_data = bytearray()
+        self._rx_view = None
+        self._rx_length = 0
+        self._rx_offset = 0
+        self._rx_timer = None
         self.bytes = None
         self.no_of_frames = 0
         self.frames_received = 0
+        self.expected_sequence_number = 1
         self.counter = 0
-        self.block_size = 4
-        self.time_between_consecutive_frames = 20
+        self.fc_profile = get_flow_control_profile(fc_profile)
+        self._rx_started = 0
+        self.rec_block_size = 0
+        self.rec_stmin = 0
+        self.cf_scheduler = ConsecutiveFrameScheduler(self.send_paced)
         self.remaining_data = None
+        self._tx_offset = 0
+        self._tx_timer = None
+        # N_As timers of single frames, kept apart from a segmented transfer's timer
+        self._sf_timers = {}
+        self._waiting_for_fc = False
         self.sequence_number = 1
-        self.transmission_lock = threading.Lock()
+        self.tx_completed_at = None
+        self._rx_first_timestamp = None
+        self._last_cf_timestamp = None
+        self.stmin_violations = 0
+        self.last_message_timing = None
 
-    def update_interface(self, interface, tx_id, channel, baud_rate, message_type):
-        self.interface = interface
-        self.can.update_interface(interface, tx_id, channel, baud_rate, message_type)
+    def send_data(self, data):
+        self.can_tp.send_data(data, self.tx_id)
 
-    def get_data(self, incoming_frame):
-        self.process_frame(incoming_frame)
+    @property
+    def receiving(self):
+        # True between a First Frame and the last Consecutive Frame
+        return self._rx_view is not None
 
-    def send_data(self, data):
-        print("send_data:", data)
-        with self.transmission_lock:
-            self.can.transmit_data(data)
+    @property
+    def transmitting(self):
+        # True from our First Frame until the last Consecutive Frame has been sent
+        return self.remaining_data is not None or self._waiting_for_fc or self.cf_scheduler.busy
 
-    def process_frame(self, incoming_frame):
+    @property
+    def tx_dl(self):
+        return self.can_tp.tx_dl
+
+    def send_paced(self, data):
+        self.can_tp.can.transmit_now(data, self.tx_id)
+
+    def process_frame(self, incoming_frame, timestamp=None):
         if all(byte == 0 for byte in incoming_frame):
-            print("Ignoring frame with all zeros")
+            if log.TRACE:
+                log.trace("Ignoring frame with all zeros")
             return
-        self.frame_type = self.frame.validate_frame(incoming_frame)
-        if self.frame_type == self.frame.SINGLE_FRAME:
-            self.store_data = []
-            self.temp = list(incoming_frame[1:])
-            self.store_data.extend(self.temp)
-            print("Sending data from single frame")
-            self.route_frame()
-        elif self.frame_type == self.frame.FIRST_FRAME:
-            self.bytes = self.frame.extract_length(incoming_frame)
-            self.no_of_frames = (self.bytes + 6) // 7
-            self.frames_received = 0
-            self.counter = min(self.no_of_frames, self.block_size)
-            self.store_data = list(incoming_frame[2:])
-            self.FC_frame = self.frame.construct_flow_control(self.counter, self.time_between_consecutive_frames)
-            self.send_data(self.FC_frame)
-            print(f"First frame received. Expecting {self.no_of_frames} more frames.")
-        elif self.frame_type == self.frame.CONSECUTIVE_FRAME:
-            self.frames_received += 1
-            self.counter -= 1
-            self.temp = list(incoming_frame[1:])
-            self.store_data.extend(self.temp)
-            print(f"Consecutive frame received. Total frames received: {self.frames_received}/{self.no_of_frames}")
-            if self.frames_received == self.no_of_frames:
-                print("All frames received. Sending data from consecutive frames.")
-                self.route_frame()
-            elif self.counter == 0:
-                if self.frames_received < self.no_of_frames:
-                    self.counter = min(self.no_of_frames - self.frames_received, self.block_size)
-                    self.FC_frame = self.frame.construct_flow_control(self.counter, self.time_between_consecutive_frames)
-                    self.send_data(self.FC_frame)
-                    print(f"Sent Flow Control frame, expecting {self.counter} more frames")
-        elif self.frame_type == self.frame.FLOW_CONTROL_FRAME:
-            self.rec_block_size = incoming_frame[1]
-            self.time_between_consecutive_frames = incoming_frame[2]
-            print(f"Flow control frame received: block size = {self.rec_block_size}, time between frames = {self.time_between_consecutive_frames} ms")
-            self.send_consecutive_frames(self.rec_block_size)
-
-    def route_frame(self):
-        self.store_data = self.frame.hex(self.store_data)
-        self.store_data = tuple(self.store_data)
-        print("Publishing data to uds")
-        self.event_manager.publish('data_to_uds', self.store_data)
-        self.store_data = []
+        if timestamp is None:
+            timestamp = time.monotonic()
+        with self._lock:
+            self.frame_type = self.frame.validate_frame(incoming_frame)
+            if self.frame_type == self.frame.SINGLE_FRAME:
+                self.abort_reception("new single frame before the last consecutive frame")
+                self.store_data = bytearray(self.frame.single_frame_payload(incoming_frame))
+                self._rx_first_timestamp = timestamp
+                if log.TRACE:
+                    log.trace("Single frame from 0x%X", self.rx_id)
+                self.route_frame(timestamp)
+            elif self.frame_type == self.frame.FIRST_FRAME:
+                if len(incoming_frame) < Frame.CLASSIC_DL:
+                    logger.warning("Ignoring short first frame from 0x%X", self.rx_id)
+                    return
+                length = self.frame.extract_length(incoming_frame)
+                if not self.frame.valid_first_frame_length(incoming_frame, length):
+                    logger.warning("Ignoring first frame from 0x%X with invalid FF_DL %d", self.rx_id, length)
+                    return
+                self.abort_reception("new first frame before the last consecutive frame")
+                self._rx_first_timestamp = timestamp
+                self.start_reassembly(incoming_frame, length)
+                self.send_flow_control()
+                if log.TRACE:
+                    log.trace("First frame received. Expecting %d more frames.", self.no_of_frames)
+            elif self.frame_type == self.frame.CONSECUTIVE_FRAME:
+                if self._rx_view is None:
+                    logger.warning("Consecutive frame from 0x%X without a First Frame, ignoring", self.rx_id)
+                    return
+                sequence_number = incoming_frame[0] & 0x0F
+                if sequence_number != self.expected_sequence_number:
+                    self.abort_reception(f"wrong sequence number {sequence_number}, expected {self.expected_sequence_number}")
+                    return
+                self.expected_sequence_number = (sequence_number + 1) & 0x0F
+                self.frames_received += 1
+                self.counter -= 1
+                self.check_stmin(timestamp)
+                self.append_consecutive_frame(incoming_frame)
+                if log.TRACE:
+                    log.trace("Consecutive frame %d/%d", self.frames_received, self.no_of_frames)
+                if self._rx_offset == self._rx_length:
+                    self.fc_profile.record_transfer(self._rx_length, self._rx_started)
+                    self.route_frame(timestamp)
+                elif self.counter == 0:
+                    self.send_flow_control()
+                    if log.TRACE:
+                        log.trace("Sent Flow Control frame, expecting %d more frames", self.counter)
+                else:
+                    self.start_rx_timer()
+            elif self.frame_type == self.frame.FLOW_CONTROL_FRAME:
+                self.process_flow_control(incoming_frame)
 
-    def process_uds_data(self, data):
-        print(data)
-        if len(data) <= 7:
-            frame = ([len(data)])
-            frame.extend(data)
-            frame.extend([0] * (8 - len(frame)))
-            frame_tuple = tuple(frame)
-            print("buffer_to_can: ", frame_tuple)
-            self._buffer_to_can.put(frame_tuple)
+    def process_flow_control(self, incoming_frame):
+        if not self._waiting_for_fc:
+            logger.warning("Unexpected flow control frame from 0x%X, ignoring", self.rx_id)
+            return
+        flow_status = incoming_frame[0] & 0x0F
+        if flow_status == Frame.FC_WAIT:
+            if log.TRACE:
+                log.trace("Flow control WAIT received, restarting N_Bs")
+            self.start_tx_timer(self.N_Bs, "N_Bs timeout")
+            return
+        if flow_status != Frame.FC_CONTINUE_TO_SEND:
+            self.abort_transmission("receiver reported overflow" if flow_status == Frame.FC_OVERFLOW
+                                    else f"invalid flow status {flow_status}")
+            return
+        self._waiting_for_fc = False
+        self.stop_tx_timer()
+        self.rec_block_size = incoming_frame[1]
+        self.rec_stmin = self.frame.decode_stmin(incoming_frame[2])
+        if log.TRACE:
+            log.trace("Flow control frame received: block size = %d, STmin = %.1f ms",
+                      self.rec_block_size, self.rec_stmin * 1000)
+        self.send_consecutive_frames(self.rec_block_size)
+
+    def send_flow_control(self):
+        block_size = self.fc_profile.block_size
+        if block_size == 0:
+            # Unlimited block: the counter never reaches 0 again, so no further FCs are sent
+            self.counter = -1
         else:
-            self.send_multi_frame(data)
+            block_size = self.counter = min(self.no_of_frames - self.frames_received, block_size)
+        self.FC_frame = self.frame.construct_flow_control(block_size, self.fc_profile.stmin)
+        # STmin only binds consecutive frames within one block
+        self._last_cf_timestamp = None
+        # The sender is blocked until our FC arrives, so it skips the tx buffer
+        self.can_tp.can.transmit_now(self.FC_frame, self.tx_id)
+        self.start_rx_timer()
+
+    def check_stmin(self, timestamp):
+        # Hardware timestamps make this a check of the bus, not of our scheduling
+        if self._last_cf_timestamp is not None:
+            if timestamp - self._last_cf_timestamp < Frame.decode_stmin(self.fc_profile.stmin):
+                self.stmin_violations += 1
+        self._last_cf_timestamp = timestamp
+
+    def start_rx_timer(self):
+        TimerWheel.cancel(self._rx_timer)
+        self._rx_timer = self.timer_wheel.schedule(self.N_Cr, self.on_rx_timeout, self._rx_view)
+
+    def on_rx_timeout(self, view):
+        with self._lock:
+            # The view identifies the transfer the timer was armed for
+            if view is not None and view is self._rx_view:
+                self.abort_reception("N_Cr timeout")
+
+    def abort_reception(self, reason):
+        TimerWheel.cancel(self._rx_timer)
+        self._rx_timer = None
+        if self._rx_view is not None:
+            logger.error("Reception from 0x%X aborted after %d/%d bytes: %s",
+                         self.rx_id, self._rx_offset, self._rx_length, reason)
+            self.fc_profile.record_overrun()
+            self._rx_view.release()
+            self._rx_view = None
+            self.store_data = bytearray()
+            self.can_tp.report_error(self, 'rx', reason)
+
+    def start_tx_timer(self, timeout, reason):
+        TimerWheel.cancel(self._tx_timer)
+        self._tx_timer = self.timer_wheel.schedule(timeout, self.on_tx_timeout, self.remaining_data, reason)
+
+    def stop_tx_timer(self):
+        TimerWheel.cancel(self._tx_timer)
+        self._tx_timer = None
+
+    def on_tx_timeout(self, data, reason):
+        with self._lock:
+            if data is self.remaining_data:
+                self.abort_transmission(reason)
+
+    def abort_transmission(self, reason):
+        self.stop_tx_timer()
+        self._waiting_for_fc = False
+        logger.error("Transmission to 0x%X aborted: %s", self.tx_id, reason)
+        if self.remaining_data is not None:
+            self.remaining_data.release()
+            self.remaining_data = None
+            self._tx_offset = 0
+            self.can_tp.report_transmission(self, False)
+        self.can_tp.report_error(self, 'tx', reason)
+
+    def set_flow_control_profile(self, profile):
+        self.fc_profile = get_flow_control_profile(profile)
+
+    def flow_control_statistics(self):
+        return self.fc_profile.statistics()
+
+    def start_reassembly(self, first_frame, length):
+        # The receive buffer is allocated once from FF_DL and filled in place,
+        # so a multi-KB response costs one allocation instead of one per CF.
+        self._rx_length = length
+        header_size = self.frame.first_frame_header_size(first_frame)
+        first_data = bytes(first_frame[header_size:])
+        # The FF is always sent at full length, so its size is the sender's TX_DL
+        cf_size = len(first_frame) - 1
+        self.bytes = self._rx_length - len(first_data)
+        self.no_of_frames = (self.bytes + cf_size - 1) // cf_size
+        self.frames_received = 0
+        self.expected_sequence_number = 1
+        self._rx_started = time.perf_counter()
+        self.store_data = bytearray(min(self._rx_length, self.RX_PREALLOC_LIMIT))
+        view = memoryview(self.store_data)
+        view[:len(first_data)] = first_data
+        self._rx_offset = len(first_data)
+        self._rx_view = view
+
+    def append_consecutive_frame(self, consecutive_frame):
+        size = min(len(consecutive_frame) - 1, self._rx_length - self._rx_offset)
+        if self._rx_offset + size > len(self.store_data):
+            self.grow_receive_buffer()
+        self._rx_view[self._rx_offset:self._rx_offset + size] = bytes(consecutive_frame[1:1 + size])
+        self._rx_offset += size
+
+    def grow_receive_buffer(self):
+        # A bytearray cannot be resized while a memoryview is exported
+        self._rx_view.release()
+        new_size = min(len(self.store_data) * 2, self._rx_length)
+        self.store_data.extend(bytes(new_size - len(self.store_data)))
+        self._rx_view = memoryview(self.store_data)
+
+    def route_frame(self, timestamp):
+        TimerWheel.cancel(self._rx_timer)
+        self._rx_timer = None
+        if self._rx_view is not None:
+            self._rx_view.release()
+            self._rx_view = None
+        sent = self.tx_completed_at
+        self.last_message_timing = {
+            'request_sent': sent,
+            'first_frame': self._rx_first_timestamp,
+            'last_frame': timestamp,
+            'latency': self._rx_first_timestamp - sent if sent is not None else None
+        }
+        if log.TRACE:
+            log.trace("Routing %d bytes from 0x%X", len(self.store_data), self.rx_id)
+        self.on_message(bytes(self.store_data))
+        self.store_data = bytearray()
+
+    def process_uds_data(self, data):
+        if log.TRACE:
+            log.trace("Segmenting %d bytes for 0x%X", len(data), self.tx_id)
+        with self._lock:
+            self.tx_completed_at = None
+            if len(data) <= self.frame.max_single_frame_length(self.tx_dl):
+                self.send_single_frame(data)
+            else:
+                self.send_multi_frame(data)
+
+    def send_single_frame(self, data):
+        frame = self.frame.construct_single_frame(data)
+        # Each frame object keys its own timer
+        self._sf_timers[id(frame)] = self.timer_wheel.schedule(self.N_As, self.on_single_frame_timeout, frame)
+        self.can_tp.queue_frame(frame, self.tx_id, lambda: self.on_single_frame_sent(frame))
+
+    def on_single_frame_sent(self, frame):
+        with self._lock:
+            TimerWheel.cancel(self._sf_timers.pop(id(frame), None))
+            self.tx_completed_at = time.monotonic()
+
+    def on_single_frame_timeout(self, frame):
+        with self._lock:
+            if self._sf_timers.pop(id(frame), None) is None:
+                return
+            logger.error("Single frame %s to 0x%X not sent: N_As timeout", frame.hex(' '), self.tx_id)
+            self.can_tp.report_error(self, 'tx', "N_As timeout")
 
     def send_multi_frame(self, data):
-        total_length = len(data)
-        first_frame = ([0x10 | (total_length >> 8), total_length & 0xFF])
-        first_frame.extend(data[:6])
-        first_frame_tuple = tuple(first_frame)
-        self._buffer_to_can.put(first_frame_tuple)
-        self.remaining_data = data[6:]
+        # Segmentation walks a memoryview cursor over the payload instead of
+        # re-slicing the remaining data for every consecutive frame.
+        if self.remaining_data is not None:
+            self.abort_transmission("superseded by a new request")
+        self.remaining_data = memoryview(bytes(data))
+        self.can_tp.report_transmission(self, True)
+        total_length = len(self.remaining_data)
+        first_frame = self.frame.construct_first_frame(total_length, self.remaining_data, self.tx_dl)
+        self._tx_offset = len(first_frame) - self.frame.first_frame_header_size(first_frame)
         self.sequence_number = 1
+        self._waiting_for_fc = True
+        self.start_tx_timer(self.N_As, "N_As timeout")
+        self.can_tp.queue_frame(first_frame, self.tx_id, self.on_block_sent)
+
+    def on_block_sent(self):
+        # Called once the FF or the last CF of a block has left; now the receiver owes us an FC
+        with self._lock:
+            if self._waiting_for_fc:
+                self.start_tx_timer(self.N_Bs, "N_Bs timeout")
+            elif self.remaining_data is None:
+                self.on_transmission_complete()
+            else:
+                self.stop_tx_timer()
 
     def send_consecutive_frames(self, received_block_size):
-        self.received_block_size = received_block_size
-        if not self.remaining_data:
+        if self.remaining_data is None:
             return
-        for _ in range(self.received_block_size):
-            if not self.remaining_data:
-                break
-            frame = ([0x20 | (self.sequence_number & 0x0F)])
-            frame.extend(self.remaining_data[:7])
-            self.remaining_data = self.remaining_data[7:]
-            if len(frame) < 8:
-                frame.extend([0xAA] * (8 - len(frame)))
-            frame_tuple = tuple(frame)
-            self._buffer_to_can.put(frame_tuple)
+        total_length = len(self.remaining_data)
+        cf_size = self.tx_dl - 1
+        # A block size of 0 means the receiver wants the rest of the message without further FCs
+        frames_left = (total_length - self._tx_offset + cf_size - 1) // cf_size
+        if received_block_size == 0 or received_block_size > frames_left:
+            received_block_size = frames_left
+        frames = []
+        for _ in range(received_block_size):
+            chunk = self.remaining_data[self._tx_offset:self._tx_offset + cf_size]
+            frames.append(self.frame.construct_consecutive_frame(self.sequence_number, chunk))
+            self._tx_offset += len(chunk)
             self.sequence_number = (self.sequence_number + 1) & 0x0F
-        if not self.remaining_data and self.received_block_size > 0:
-            print("No more data to send. Sending 'AA' as padding data.")
-            while self.received_block_size > 0:
-                frame = ([0x20 | (self.sequence_number & 0x0F)])
-                frame.extend([0xAA] * 7)
-                frame_tuple = tuple(frame)
-                self._buffer_to_can.put(frame_tuple)
-                self.sequence_number = (self.sequence_number + 1) & 0x0F
-                self.received_block_size -= 1
-        self.received_block_size = 0
+        if self._tx_offset >= total_length:
+            self.remaining_data.release()
+            self.remaining_data = None
+            self._tx_offset = 0
+        else:
+            self._waiting_for_fc = True
+            self.start_tx_timer(self.N_As, "N_As timeout")
+        # The block is paced by the scheduler thread so the ECU's STmin is respected
+        self.cf_scheduler.schedule(frames, self.rec_stmin, self.on_block_sent)
+
+    def on_transmission_complete(self):
+        # Host time once the driver took the last frame; the drivers here report no tx timestamps
+        self.stop_tx_timer()
+        self.tx_completed_at = time.monotonic()
+        self.can_tp.report_transmission(self, False)
+
+    def inter_frame_gaps(self):
+        return self.cf_scheduler.gap_statistics()
+
+    def timing_statistics(self):
+        return {
+            'stmin_violations': self.stmin_violations,
+            'last_message': self.last_message_timing
+        }
+
+    def close(self):
+        with self._lock:
+            TimerWheel.cancel(self._rx_timer)
+            self._rx_timer = None
+            self.stop_tx_timer()
+            for timer in self._sf_timers.values():
+                TimerWheel.cancel(timer)
+            self._sf_timers.clear()
+        self.cf_scheduler.stop()
+
+
+class CAN_TP:
+    def __init__(self, interface, tx_id, channel, baud_rate, message_type, event_manager: EventManager) -> None:
+        self.event_manager = event_manager
+        self.interface = interface
+        self.tx_id = tx_id
+        self.can = CAN(interface, tx_id, channel, baud_rate, message_type, event_manager)
+        self.event_manager.subscribe('data_received', self.get_data)
+        self.event_manager.subscribe('rx_id', self.get_rx_id)
+        self._buffer_to_can = queue.Queue()
+        self._buffer_from_uds = queue.Queue()
+        self.timer_wheel = TimerWheel.shared()
+        self.channels = {}
+        self._rx_routes = {}
+        self.default_channel = None
+        self.default_fc_profile = 'default'
+        self.transmission_lock = threading.Lock()
+        self.update_tx_dl()
+
+    def update_tx_dl(self):
+        # CAN FD interfaces carry 64-byte ISO-TP frames, classic CAN 8
+        self.tx_dl = Frame.FD_DL if self.can.hardware_interface.is_fd else Frame.CLASSIC_DL
+
+    def update_interface(self, interface, tx_id, channel, baud_rate, message_type):
+        # The default channel is reopened when UDS re-announces its rx_id
+        self.interface = interface
+        self.tx_id = tx_id
+        self.can.update_interface(interface, tx_id, channel, baud_rate, message_type)
+        self.update_tx_dl()
+
+    def close(self):
+        for tx_id, rx_id in list(self.channels):
+            self.close_channel(tx_id, rx_id)
+        self.default_channel = None
+        self.event_manager.unsubscribe('data_received', self.get_data)
+        self.event_manager.unsubscribe('rx_id', self.get_rx_id)
+        self.can.close()
+
+    def get_rx_id(self, rx_id):
+        # The UDS layer announces its physical response ID; that pair becomes the default channel
+        if self.default_channel is not None:
+            self.close_channel(self.default_channel.tx_id, self.default_channel.rx_id)
+        self.default_channel = self.open_channel(self.tx_id, rx_id, self.publish_to_uds, self.default_fc_profile)
+
+    def set_flow_control_profile(self, profile, channel=None):
+        if channel is None:
+            self.default_fc_profile = profile
+            channel = self.default_channel
+        if channel is not None:
+            channel.set_flow_control_profile(profile)
+
+    def publish_to_uds(self, data):
+        self.event_manager.publish('data_to_uds', data)
+
+    def open_channel(self, tx_id, rx_id, on_message, fc_profile='default'):
+        """
+        Registers an address pair with its own reassembly state. `on_message`
+        is called with the complete payload (bytes) received on `rx_id`, and
+        `fc_profile` is a FlowControlProfile or a FLOW_CONTROL_PROFILES name.
+        """
+        if getattr(self.can.hardware_interface, 'isotp', False):
+            # The kernel does ISO-TP for this pair, so its raw frames never come through CAN
+            channel = IsoTpSocketChannel(self, tx_id, rx_id, on_message, fc_profile)
+            self.channels[(tx_id, rx_id)] = channel
+            return channel
+        channel = IsoTpChannel(self, tx_id, rx_id, on_message, fc_profile)
+        self.channels[(tx_id, rx_id)] = channel
+        self._rx_routes[rx_id] = channel
+        self.can.add_rx_id(rx_id)
+        return channel
+
+    def close_channel(self, tx_id, rx_id):
+        channel = self.channels.pop((tx_id, rx_id), None)
+        if channel is None:
+            return
+        channel.close()
+        if self._rx_routes.get(rx_id) is channel:
+            del self._rx_routes[rx_id]
+            self.can.remove_rx_id(rx_id)
+
+    def get_channel(self, tx_id, rx_id):
+        return self.channels.get((tx_id, rx_id))
+
+    def transmitting(self, tx_id):
+        return any(channel.transmitting for (channel_tx_id, _), channel in list(self.channels.items())
+                   if channel_tx_id == tx_id)
+
+    def route(self, rx_id):
+        # The channel that frames received on `rx_id` are handed to, if any
+        return self._rx_routes.get(rx_id)
+
+    def get_data(self, frame):
+        channel = self._rx_routes.get(frame.arbitration_id)
+        if channel is None:
+            return
+        channel.process_frame(frame.data, frame.timestamp)
+
+    def send_data(self, data, tx_id=None, on_sent=None):
+        with self.transmission_lock:
+            self.can.transmit_data(data, tx_id, on_sent)
+
+    def queue_frame(self, frame, tx_id, on_sent=None):
+        self._buffer_to_can.put((tx_id, frame, on_sent))
+
+    def report_error(self, channel, direction, reason):
+        self.event_manager.publish('cantp_error', {
+            'tx_id': channel.tx_id,
+            'rx_id': channel.rx_id,
+            'direction': direction,
+            'reason': reason
+        })
+
+    def report_transmission(self, channel, active):
+        # Segmented transfers starting and ending, for whatever must stay off the bus meanwhile
+        self.event_manager.publish('cantp_transmission', {'tx_id': channel.tx_id, 'active': active})
+
+    def process_frame(self, incoming_frame, timestamp=None):
+        # Frames handed in without an address belong to the default channel
+        self.default_channel.process_frame(incoming_frame, timestamp)
+
+    def process_uds_data(self, data, channel=None):
+        (channel or self.default_channel).process_uds_data(data)
+
+    def inter_frame_gaps(self):
+        return {key: channel.inter_frame_gaps() for key, channel in self.channels.items()}
+
+    def flow_control_statistics(self):
+        return {key: channel.flow_control_statistics() for key, channel in self.channels.items()}
+
+    def timing_statistics(self):
+        return {key: channel.timing_statistics() for key, channel in self.channels.items()}
 
     def send_data_to_can(self):
         while not self._buffer_to_can.empty():
-            self.frame_to_can = self._buffer_to_can.get()
-            print("sending data to can: ", self.frame_to_can)
-            self.send_data(self.frame_to_can)
+            tx_id, self.frame_to_can, on_sent = self._buffer_to_can.get()
+            self.send_data(self.frame_to_can, tx_id, on_sent)
 
-    def receive_data_from_uds(self, data):
-        print("Data received from uds: ", data)
-        self._buffer_from_uds.put(data)
+    def receive_data_from_uds(self, data, channel=None):
+        if log.TRACE:
+            log.trace("Data received from uds: %s", data)
+        self._buffer_from_uds.put((channel, data))
 
     def process_uds_queue(self):
         while not self._buffer_from_uds.empty():
-            data = self._buffer_from_uds.get()
-            print("process uds data: ", data)
-            self.process_uds_data(data)
+            channel, data = self._buffer_from_uds.get()
+            self.process_uds_data(data, channel)
 
     def cantp_monitor(self):
         self.process_uds_queue()
-        self.send_data_to_can()
\ No newline at end of file
+        self.send_data_to_can()
@@ -0,0 +1,91 @@
+from collections import deque
+import queue
+import threading
+import time
+
+
+class ConsecutiveFrameScheduler:
+    # Below this much time left we stop trusting time.sleep() and spin on
+    # perf_counter instead, so sub-millisecond STmin values are honoured.
+    SPIN_THRESHOLD = 0.002
+
+    def __init__(self, send, max_gap_samples=1024):
+        self._send = send
+        self._blocks = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._last_sent = None
+        # Blocks queued or being sent
+        self._outstanding = 0
+        self.inter_frame_gaps = deque(maxlen=max_gap_samples)
+
+    def schedule(self, frames, stmin, on_complete=None):
+        """
+        Queues one block of consecutive frames to be sent with at least `stmin`
+        seconds between them. `on_complete` is called after the last frame.
+        """
+        with self._thread_lock:
+            self._outstanding += 1
+        self._blocks.put((frames, stmin, on_complete))
+        self._ensure_running()
+
+    @property
+    def busy(self):
+        return self._outstanding > 0
+
+    def _ensure_running(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        # Blocks already queued are still sent; the sentinel ends the thread after them
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+            if thread is None or not thread.is_alive():
+                return
+            self._blocks.put(None)
+        if thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self):
+        while True:
+            block = self._blocks.get()
+            if block is None:
+                return
+            frames, stmin, on_complete = block
+            # STmin applies between CFs of a block, not across the FC that separates blocks
+            self._last_sent = None
+            for frame in frames:
+                if self._last_sent is not None:
+                    self.wait_until(self._last_sent + stmin)
+                self._send(frame)
+                now = time.perf_counter()
+                if self._last_sent is not None:
+                    self.inter_frame_gaps.append(now - self._last_sent)
+                self._last_sent = now
+            with self._thread_lock:
+                self._outstanding -= 1
+            if on_complete is not None:
+                on_complete()
+
+    @classmethod
+    def wait_until(cls, deadline):
+        # Hybrid timer: coarse sleep for the bulk of the wait, then spin for the tail
+        remaining = deadline - time.perf_counter()
+        if remaining > cls.SPIN_THRESHOLD:
+            time.sleep(remaining - cls.SPIN_THRESHOLD)
+        while time.perf_counter() < deadline:
+            pass
+
+    def gap_statistics(self):
+        gaps = list(self.inter_frame_gaps)
+        if not gaps:
+            return {'count': 0, 'min': None, 'max': None, 'mean': None}
+        return {
+            'count': len(gaps),
+            'min': min(gaps),
+            'max': max(gaps),
+            'mean': sum(gaps) / len(gaps)
+        }
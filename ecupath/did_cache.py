@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DidCache:
+    """
+    Per-ECU cache of DID values read with 0x22. Each DID has a TTL in
+    seconds: 0 (the default) never caches, STATIC keeps the value until
+    the session changes or the ECU resets. Writes with 0x2E invalidate
+    the DID they wrote. Unless `ttls` says otherwise, the ISO 14229
+    identification DIDs in IDENTIFICATION_DIDS are STATIC.
+    """
+    STATIC = float('inf')
+    # Spare part, software and hardware numbers, supplier ID, manufacturing date, serial number, VIN, system name
+    IDENTIFICATION_DIDS = (0xF187, 0xF188, 0xF18A, 0xF18B, 0xF18C, 0xF190, 0xF191,
+                           0xF192, 0xF193, 0xF194, 0xF195, 0xF197)
+
+    def __init__(self, default_ttl=0, ttls=None):
+        self.default_ttl = default_ttl
+        self.ttls = dict.fromkeys(self.IDENTIFICATION_DIDS, self.STATIC) if ttls is None else dict(ttls)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def set_ttl(self, did, ttl):
+        with self._lock:
+            self.ttls[did] = ttl
+            self._entries.pop(did, None)
+
+    def ttl(self, did):
+        return self.ttls.get(did, self.default_ttl)
+
+    def get(self, did):
+        """Returns the cached value of `did`, or None on a miss."""
+        if self.ttl(did) <= 0:
+            # Not cacheable, so not a miss either
+            return None
+        with self._lock:
+            entry = self._entries.get(did)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[did]
+            self.misses += 1
+            return None
+
+    def put(self, did, data):
+        ttl = self.ttl(did)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[did] = (time.monotonic() + ttl, bytes(data))
+
+    def invalidate(self, did):
+        with self._lock:
+            if self._entries.pop(did, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def statistics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries)
+            }
@@ -0,0 +1,101 @@
+from .async_uds import AsyncCAN_TP, AsyncUDSClient
+from .uds_sid_19 import Ox19
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DtcSweep:
+    """
+    Reads the DTCs of a whole vehicle with 0x19 0x02 and merges them into
+    one report. `buses` maps a bus name to an open hardware interface, and
+    each of `ecus` is a dict with 'name', 'bus', 'tx_id' and 'rx_id'.
+
+    Each bus gets its own AsyncCAN_TP and each ECU its own AsyncUDSClient,
+    so ECUs are read concurrently. Only the requests to a single ECU are
+    sequential. With `snapshot_record` or `extended_record` set, every
+    DTC found is followed up with 0x19 0x04 or 0x19 0x06 for that record
+    number (0xFF for all).
+    """
+
+    def __init__(self, buses, ecus, status_mask=0xFF, snapshot_record=None, extended_record=None, session=None,
+                 p2_timer=0.05, p2_star_timer=5):
+        self.buses = buses
+        self.ecus = ecus
+        self.status_mask = status_mask
+        self.snapshot_record = snapshot_record
+        self.extended_record = extended_record
+        self.session = session
+        self.p2_timer = p2_timer
+        self.p2_star_timer = p2_star_timer
+
+    def run(self):
+        """Blocking entry point for code without an event loop."""
+        return asyncio.run(self.run_async())
+
+    async def run_async(self):
+        started = time.time()
+        transports = {}
+        try:
+            for bus in {ecu['bus'] for ecu in self.ecus}:
+                transports[bus] = AsyncCAN_TP(self.buses[bus])
+                await transports[bus].start()
+            results = await asyncio.gather(*(self.sweep_ecu(transports[ecu['bus']], ecu) for ecu in self.ecus))
+        finally:
+            for transport in transports.values():
+                await transport.stop()
+        report = {
+            'started': started,
+            'duration': time.time() - started,
+            'ecus': {ecu['name']: result for ecu, result in zip(self.ecus, results)},
+            'dtc_count': sum(len(result['dtcs']) for result in results),
+            'failed_ecus': [ecu['name'] for ecu, result in zip(self.ecus, results) if result['error'] is not None]
+        }
+        logger.info("DTC sweep of %d ECUs found %d DTCs in %.2fs (%d ECUs failed)",
+                    len(self.ecus), report['dtc_count'], report['duration'], len(report['failed_ecus']))
+        return report
+
+    async def sweep_ecu(self, can_tp, ecu):
+        client = AsyncUDSClient(can_tp, ecu['tx_id'], ecu['rx_id'], self.p2_timer, self.p2_star_timer)
+        result = {
+            'bus': ecu['bus'],
+            'tx_id': ecu['tx_id'],
+            'rx_id': ecu['rx_id'],
+            'availability_mask': None,
+            'dtcs': [],
+            'error': None
+        }
+        try:
+            if self.session is not None:
+                await client.start_session(self.session)
+            response = await client.request(0x19, bytes((0x02, self.status_mask)))
+            result['availability_mask'] = response[2] if len(response) > 2 else None
+            for dtc, status in Ox19.parse_dtc_records(response[3:]):
+                entry = {
+                    'dtc': f"{dtc:06X}",
+                    'system': Ox19.dtc_system(dtc),
+                    'status': status,
+                    'status_text': Ox19.decode_dtc_status(status)
+                }
+                if self.snapshot_record is not None:
+                    entry['snapshot'] = await self.read_record(client, 0x04, dtc, self.snapshot_record)
+                if self.extended_record is not None:
+                    entry['extended_data'] = await self.read_record(client, 0x06, dtc, self.extended_record)
+                result['dtcs'].append(entry)
+        except Exception as e:
+            logger.error("DTC sweep of %s failed: %s", ecu['name'], e)
+            result['error'] = str(e)
+        finally:
+            client.close()
+        return result
+
+    @staticmethod
+    async def read_record(client, subfunction, dtc, record):
+        # Records are returned raw after the echoed DTC and status; their layout is ECU specific
+        try:
+            response = await client.request(0x19, bytes((subfunction,)) + dtc.to_bytes(3, 'big') + bytes((record,)))
+        except Exception as e:
+            return {'error': str(e)}
+        return {'data': response[6:].hex(' ').upper()}
@@ -1,4 +1,5 @@
 from typing import Callable, Dict, List
+from . import log
 
 class EventManager:
     def __init__(self):
@@ -18,8 +19,8 @@ class EventManager:
         if event_type in self.subscribers and self.subscribers[event_type]:
             for callback in self.subscribers[event_type]:
                 callback(data)
-        else:
-            print(f"No subscribers for event: {event_type}")
+        elif log.TRACE:
+            log.trace("No subscribers for event: %s", event_type)
 
     def subscriber_count(self, event_type: str) -> int:
         return len(self.subscribers.get(event_type, []))
@@ -0,0 +1,77 @@
+from collections import deque
+import time
+
+
+class FlowControlProfile:
+    """
+    Block size and STmin we advertise in our Flow Control frames.
+    `stmin` is the raw FC byte (0x00-0x7F ms, 0xF1-0xF9 for 100-900 us)
+    and a block size of 0 lets the sender transmit without further FCs.
+    """
+    # Adaptive mode walks these ladders one step per successful transfer and
+    # falls back one step whenever a transfer is lost.
+    STMIN_LADDER = (0x7F, 0x32, 0x14, 0x0A, 0x05, 0x02, 0x01, 0xF5, 0xF1, 0x00)
+    BLOCK_SIZE_LADDER = (1, 2, 4, 8, 16, 32, 64, 0)
+
+    def __init__(self, block_size=4, stmin=20, adaptive=False, max_samples=64):
+        self.block_size = block_size
+        self.stmin = stmin
+        self.adaptive = adaptive
+        self.transfers = 0
+        self.overruns = 0
+        self.throughput = deque(maxlen=max_samples)
+
+    def copy(self):
+        return FlowControlProfile(self.block_size, self.stmin, self.adaptive, self.throughput.maxlen)
+
+    def record_transfer(self, length, started):
+        elapsed = time.perf_counter() - started
+        self.transfers += 1
+        self.throughput.append((length, elapsed, self.block_size, self.stmin))
+        if self.adaptive:
+            self.block_size = self._step(self.BLOCK_SIZE_LADDER, self.block_size, 1)
+            self.stmin = self._step(self.STMIN_LADDER, self.stmin, 1)
+
+    def record_overrun(self):
+        self.overruns += 1
+        if self.adaptive:
+            self.block_size = self._step(self.BLOCK_SIZE_LADDER, self.block_size, -1)
+            self.stmin = self._step(self.STMIN_LADDER, self.stmin, -1)
+
+    @staticmethod
+    def _step(ladder, value, direction):
+        if value in ladder:
+            index = ladder.index(value)
+        else:
+            # Values set by hand snap to the nearest rung in the direction of travel
+            index = 0 if direction > 0 else len(ladder) - 1
+        index = max(0, min(len(ladder) - 1, index + direction))
+        return ladder[index]
+
+    def statistics(self):
+        samples = [(length, elapsed) for length, elapsed, _, _ in self.throughput if elapsed > 0]
+        total_bytes = sum(length for length, _ in samples)
+        total_time = sum(elapsed for _, elapsed in samples)
+        return {
+            'block_size': self.block_size,
+            'stmin': self.stmin,
+            'adaptive': self.adaptive,
+            'transfers': self.transfers,
+            'overruns': self.overruns,
+            'bytes_per_second': total_bytes / total_time if total_time else None
+        }
+
+
+FLOW_CONTROL_PROFILES = {
+    'default': FlowControlProfile(block_size=4, stmin=20),
+    'fast': FlowControlProfile(block_size=0, stmin=0),
+    'conservative': FlowControlProfile(block_size=8, stmin=10),
+    'adaptive': FlowControlProfile(block_size=4, stmin=20, adaptive=True)
+}
+
+
+def get_flow_control_profile(profile):
+    # Named presets are copied so every channel keeps its own counters
+    if isinstance(profile, FlowControlProfile):
+        return profile
+    return FLOW_CONTROL_PROFILES[profile].copy()
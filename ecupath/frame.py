@@ -1,4 +1,7 @@
 from .UDSException import UDSException
+import logging
+
+logger = logging.getLogger(__name__)
 
 class Frame:
     SINGLE_FRAME: int = 0
@@ -6,6 +9,14 @@ class Frame:
     CONSECUTIVE_FRAME: int = 2
     FLOW_CONTROL_FRAME: int = 3
     ERROR_FRAME: int = 4
+    MAX_FF_DL: int = 0xFFF
+    FC_CONTINUE_TO_SEND: int = 0
+    FC_WAIT: int = 1
+    FC_OVERFLOW: int = 2
+    CLASSIC_DL: int = 8
+    FD_DL: int = 64
+    # Payload lengths addressable by the 4-bit CAN FD DLC, indexed by DLC
+    FD_DLC_LENGTHS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64)
 
     def validate_frame(self, response):
         """
@@ -27,8 +38,7 @@ class Frame:
         raise Exception("Unexpected response format")
 
     def get_sid(self, frame):
-        sid = frame[0]
-        sid_int = int(sid, 16)
+        sid_int = frame[0]
         if sid_int == 0x7F:
             pass
         else:
@@ -36,10 +46,87 @@ class Frame:
         return sid_int
         
     def extract_length(self, frame):
-        # The length is extracted from the first two bytes for a first frame
-        length = (((frame[0] & 0x0F) << 8) | frame[1]) - 6
+        # The length is extracted from the first two bytes for a first frame (FF_DL)
+        length = ((frame[0] & 0x0F) << 8) | frame[1]
+        if length == 0:
+            # ISO 15765-2:2016 escape sequence: FF_DL follows as a 32-bit value
+            length = (frame[2] << 24) | (frame[3] << 16) | (frame[4] << 8) | frame[5]
         return length
+
+    @staticmethod
+    def valid_first_frame_length(frame, length):
+        # ISO 15765-2 ignores an FF whose FF_DL would have fit a single frame of the
+        # sender's TX_DL (the FF's own length), or an escape FF announcing <= 4095 bytes
+        if Frame.first_frame_header_size(frame) == 6:
+            return length > Frame.MAX_FF_DL
+        return length > Frame.max_single_frame_length(len(frame))
+
+    @staticmethod
+    def first_frame_header_size(frame):
+        # 2 PCI bytes, plus 4 length bytes when the escape sequence is used
+        return 6 if ((frame[0] & 0x0F) == 0 and frame[1] == 0) else 2
+
+    @staticmethod
+    def construct_first_frame(total_length, data, tx_dl=CLASSIC_DL):
+        if total_length > Frame.MAX_FF_DL:
+            return b'\x10\x00' + total_length.to_bytes(4, 'big') + bytes(data[:tx_dl - 6])
+        return bytes((0x10 | (total_length >> 8), total_length & 0xFF)) + bytes(data[:tx_dl - 2])
+
+    @staticmethod
+    def max_single_frame_length(tx_dl=CLASSIC_DL):
+        # CAN FD single frames above 7 bytes use the escape form: 0x00, SF_DL, data
+        return 7 if tx_dl <= Frame.CLASSIC_DL else tx_dl - 2
+
+    @staticmethod
+    def construct_single_frame(data):
+        if len(data) <= 7:
+            return bytes((len(data),)) + bytes(data) + bytes(7 - len(data))
+        frame = bytes((0x00, len(data))) + bytes(data)
+        return frame + bytes(Frame.padded_length(len(frame)) - len(frame))
+
+    @staticmethod
+    def construct_consecutive_frame(sequence_number, chunk):
+        frame = bytes((0x20 | sequence_number,)) + bytes(chunk)
+        return frame + b'\xAA' * (Frame.padded_length(len(frame)) - len(frame))
+
+    @staticmethod
+    def single_frame_payload(frame):
+        length = frame[0] & 0x0F
+        if length == 0 and len(frame) > Frame.CLASSIC_DL:
+            length = frame[1]
+            return frame[2:2 + length]
+        return frame[1:1 + length]
+
+    @staticmethod
+    def padded_length(length):
+        # Frames are never shorter than a classic frame, and FD frames round up to the next DLC step
+        for valid_length in Frame.FD_DLC_LENGTHS[8:]:
+            if length <= valid_length:
+                return valid_length
+        raise ValueError(f"Frame length {length} exceeds CAN FD maximum")
+
+    @staticmethod
+    def length_to_dlc(length):
+        if length <= 8:
+            return length
+        return Frame.FD_DLC_LENGTHS.index(Frame.padded_length(length))
+
+    @staticmethod
+    def dlc_to_length(dlc):
+        return Frame.FD_DLC_LENGTHS[dlc]
     
+    @staticmethod
+    def decode_stmin(stmin):
+        """
+        Converts a received STmin byte to seconds.
+        """
+        if stmin <= 0x7F:
+            return stmin / 1000
+        if 0xF1 <= stmin <= 0xF9:
+            return (stmin - 0xF0) / 10000
+        # Reserved values are treated as the longest valid STmin (127 ms)
+        return 0x7F / 1000
+
     @staticmethod
     def negative_response(response):
         return True if response[1] == 0x7F else False
@@ -58,13 +145,13 @@ class Frame:
                     try:
                         return f"0x{int(x, 0):02X}"
                     except ValueError:
-                        print(f"Warning: Unable to convert to hex: {x}")
+                        logger.warning("Unable to convert to hex: %s", x)
                         return x
             else:
-                print(f"Warning: Unexpected type in hex conversion: {type(x)} for value: {x}")
+                logger.warning("Unexpected type in hex conversion: %s for value: %s", type(x), x)
                 return str(x)
 
         return tuple(process_hex(m) for m in msg)
     
     def construct_flow_control(self, block_size, time_between_consecutive_frame):
-        return (0x30, block_size, time_between_consecutive_frame, 0x00, 0x00, 0x00, 0x00, 0x00)
+        return bytes((0x30, block_size, time_between_consecutive_frame, 0x00, 0x00, 0x00, 0x00, 0x00))
@@ -0,0 +1,186 @@
+from .frame import Frame
+from .request_scheduler import response_matches, suppresses_response
+from .timer_wheel import TimerWheel
+from .UDSException import UDSException
+from collections import deque
+from concurrent.futures import Future
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Physical response ID -> physical request ID of the eight legislated OBD ECUs (ISO 15765-4)
+OBD_ECUS = {0x7E8 + i: 0x7E0 + i for i in range(8)}
+
+
+class FunctionalRequest:
+    __slots__ = ('request', 'future', 'results', 'in_progress', 'timers', 'window_open')
+
+    def __init__(self, request):
+        self.request = request
+        self.future = Future()
+        self.results = {}
+        # ECUs that answered 0x78 or were still sending consecutive frames when P2 ended
+        self.in_progress = set()
+        self.timers = {}
+        self.window_open = True
+
+
+class FunctionalClient:
+    """
+    Sends functionally addressed requests (0x7DF unless configured) and
+    collects the physical response of every ECU in `ecus`, a map of
+    response ID to physical request ID. Each ECU has its own ISO-TP
+    channel, so segmented responses are reassembled in parallel and flow
+    control goes to the ECU's physical request ID.
+
+    Collection ends P2 after the request has been sent. An ECU that
+    answered 0x78 gets P2*, and one still sending consecutive frames is
+    waited for. `request` returns a Future for {response ID: result},
+    where a result is the positive response, the UDSException for an NRC,
+    or a TimeoutError/ConnectionError. ECUs that stay silent are left out.
+
+    A response ID already routed elsewhere, e.g. to a physical UDS client,
+    is shared. `claims` maps such an ID to a callable telling whether a
+    response belongs to that owner; only those are passed on. Shared IDs
+    without an entry pass on what the functional request does not take.
+    """
+    FUNCTIONAL_ID = 0x7DF
+
+    def __init__(self, can_tp, ecus=None, functional_id=FUNCTIONAL_ID, p2_timer=0.05, p2_star_timer=5, claims=None):
+        self.can_tp = can_tp
+        self.ecus = dict(ecus or OBD_ECUS)
+        self.functional_id = functional_id
+        self.p2_timer = p2_timer
+        self.p2_star_timer = p2_star_timer
+        self.claims = dict(claims or {})
+        self.timer_wheel = TimerWheel.shared()
+        self._lock = threading.RLock()
+        self._queue = deque()
+        self._current = None
+        self._channels = {}
+        self._shared = {}
+        for rx_id, tx_id in self.ecus.items():
+            self._attach(rx_id, tx_id)
+        can_tp.event_manager.subscribe('cantp_error', self.process_transport_error)
+
+    def _attach(self, rx_id, tx_id):
+        channel = self.can_tp.route(rx_id)
+        if channel is None:
+            self._channels[rx_id] = self.can_tp.open_channel(
+                tx_id, rx_id, lambda data, rx_id=rx_id: self.process_response(rx_id, data))
+            return
+        forward = channel.on_message
+        claims = self.claims.get(rx_id)
+
+        def tee(data, rx_id=rx_id):
+            if claims is not None and claims(data):
+                forward(data)
+            elif not self.process_response(rx_id, data) and claims is None:
+                forward(data)
+        self._shared[rx_id] = (channel, forward)
+        self._channels[rx_id] = channel
+        channel.on_message = tee
+
+    def request(self, data):
+        data = bytes(data)
+        if len(data) > Frame.max_single_frame_length(self.can_tp.tx_dl):
+            raise ValueError(f"Functional requests must fit in a single frame, got {len(data)} bytes")
+        pending = FunctionalRequest(data)
+        with self._lock:
+            self._queue.append(pending)
+            self._pump()
+        return pending.future
+
+    def _pump(self):
+        while self._current is None and self._queue:
+            pending = self._queue.popleft()
+            if not pending.future.set_running_or_notify_cancel():
+                continue
+            self._current = pending
+            logger.debug("Sending functional request %s to 0x%X", pending.request.hex(' '), self.functional_id)
+            self.can_tp.queue_frame(Frame.construct_single_frame(pending.request), self.functional_id,
+                                    lambda pending=pending: self._on_sent(pending))
+
+    def _on_sent(self, pending):
+        with self._lock:
+            if pending is not self._current:
+                return
+            if suppresses_response(pending.request):
+                pending.window_open = False
+                self._check_done(pending)
+                return
+            pending.timers[None] = self.timer_wheel.schedule(self.p2_timer, self._on_p2, pending)
+
+    def process_response(self, rx_id, data):
+        """Returns True if the response was taken by the current request."""
+        with self._lock:
+            pending = self._current
+            if pending is None or rx_id in pending.results or not response_matches(pending.request, data):
+                return False
+            if data[0] == 0x7F and len(data) >= 3 and data[2] == 0x78:
+                pending.in_progress.add(rx_id)
+                TimerWheel.cancel(pending.timers.get(rx_id))
+                pending.timers[rx_id] = self.timer_wheel.schedule(self.p2_star_timer, self._on_p2_star, pending, rx_id)
+                return True
+            self._record(pending, rx_id, UDSException.create_exception(data[2]) if data[0] == 0x7F else data)
+            return True
+
+    def process_transport_error(self, error):
+        rx_id = error['rx_id']
+        if rx_id not in self.ecus:
+            return
+        with self._lock:
+            pending = self._current
+            if pending is not None and rx_id not in pending.results:
+                self._record(pending, rx_id, ConnectionError(f"Transport layer: {error['reason']}"))
+
+    def _on_p2(self, pending):
+        with self._lock:
+            if pending is not self._current:
+                return
+            pending.window_open = False
+            for rx_id, channel in self._channels.items():
+                if rx_id not in pending.results and getattr(channel, 'receiving', False):
+                    pending.in_progress.add(rx_id)
+            self._check_done(pending)
+
+    def _on_p2_star(self, pending, rx_id):
+        with self._lock:
+            if pending is self._current and rx_id in pending.in_progress:
+                self._record(pending, rx_id, TimeoutError(f"No response from 0x{rx_id:X} within P2*"))
+
+    def _record(self, pending, rx_id, result):
+        TimerWheel.cancel(pending.timers.pop(rx_id, None))
+        pending.in_progress.discard(rx_id)
+        pending.results[rx_id] = result
+        self._check_done(pending)
+
+    def _check_done(self, pending):
+        if pending.window_open or pending.in_progress:
+            return
+        for timer in pending.timers.values():
+            TimerWheel.cancel(timer)
+        self._current = None
+        logger.debug("Functional request %s answered by %d ECUs", pending.request.hex(' '), len(pending.results))
+        pending.future.set_result(pending.results)
+        self._pump()
+
+    def close(self):
+        self.can_tp.event_manager.unsubscribe('cantp_error', self.process_transport_error)
+        with self._lock:
+            pending, self._current = self._current, None
+            queued, self._queue = list(self._queue), deque()
+            for rx_id, channel in self._channels.items():
+                if rx_id in self._shared:
+                    channel.on_message = self._shared[rx_id][1]
+                else:
+                    self.can_tp.close_channel(channel.tx_id, rx_id)
+            self._channels.clear()
+            self._shared.clear()
+        if pending is not None:
+            for timer in pending.timers.values():
+                TimerWheel.cancel(timer)
+            pending.future.set_exception(ConnectionError("Functional client closed"))
+        for queued_request in queued:
+            queued_request.future.cancel()
@@ -0,0 +1,107 @@
+from .frame import Frame
+from .timer_wheel import TimerWheel
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class KeepAliveScheduler:
+    """
+    Keeps diagnostic sessions open by sending Tester Present with the
+    suppress-positive-response bit set, so the ECU sends nothing back and
+    the request queue is never involved. Each tx_id gets its own timer.
+    Where the hardware can transmit the frame cyclically on its own, that
+    is used instead and the host does no keep-alive work at all.
+
+    A single frame on the physical ID makes the ECU abort a segmented
+    request it is receiving. With `is_busy(tx_id)` given, a keep-alive
+    that falls inside such a transfer is deferred until it is over. The
+    hardware cannot defer a cyclic frame, so the transport calls `hold`
+    when a transfer starts, which stops the hardware task, and `release`
+    when it ends, which starts it again.
+    """
+    TESTER_PRESENT = (0x3E, 0x80)
+    # How soon a deferred keep-alive checks the channel again
+    RETRY_DELAY = 0.05
+
+    def __init__(self, can, interval=2.0, use_hardware=True, is_busy=None):
+        self.can = can
+        self.interval = interval
+        self.use_hardware = use_hardware
+        self.is_busy = is_busy
+        self.timer_wheel = TimerWheel.shared()
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def start(self, tx_id):
+        with self._lock:
+            if tx_id in self._sessions:
+                return
+            if self.use_hardware and self.is_busy is not None and self.is_busy(tx_id):
+                self._sessions[tx_id] = ('held', None)
+                return
+            self._start(tx_id)
+
+    def _start(self, tx_id):
+        frame = Frame.construct_single_frame(self.TESTER_PRESENT)
+        task = None
+        if self.use_hardware:
+            task = self.can.hardware_interface.start_periodic(tx_id, frame, self.interval)
+        if task is not None:
+            self._sessions[tx_id] = ('hardware', task)
+            logger.info("Tester present on 0x%X handed to hardware every %ss", tx_id, self.interval)
+        else:
+            self._sessions[tx_id] = ('timer', None)
+            self._schedule(tx_id, frame)
+
+    def hold(self, tx_id):
+        """Stops a hardware keep-alive on `tx_id` until `release`."""
+        with self._lock:
+            kind, task = self._sessions.get(tx_id, (None, None))
+            if kind != 'hardware':
+                return
+            self._sessions[tx_id] = ('held', None)
+        self.can.hardware_interface.stop_periodic(task)
+
+    def release(self, tx_id):
+        with self._lock:
+            kind, _ = self._sessions.get(tx_id, (None, None))
+            if kind == 'held':
+                self._start(tx_id)
+
+    def stop(self, tx_id):
+        with self._lock:
+            session = self._sessions.pop(tx_id, None)
+        if session is None:
+            return
+        kind, task = session
+        if kind == 'hardware':
+            self.can.hardware_interface.stop_periodic(task)
+        else:
+            TimerWheel.cancel(task)
+
+    def stop_all(self):
+        for tx_id in list(self._sessions):
+            self.stop(tx_id)
+
+    def is_active(self, tx_id):
+        return tx_id in self._sessions
+
+    def _schedule(self, tx_id, frame, delay=None):
+        handle = self.timer_wheel.schedule(self.interval if delay is None else delay, self._send, tx_id, frame)
+        self._sessions[tx_id] = ('timer', handle)
+
+    def _send(self, tx_id, frame):
+        with self._lock:
+            if tx_id not in self._sessions:
+                return
+            if self.is_busy is not None and self.is_busy(tx_id):
+                self._schedule(tx_id, frame, self.RETRY_DELAY)
+                return
+            # Re-arm first so a slow bus write does not push the next keep-alive back
+            self._schedule(tx_id, frame)
+        try:
+            self.can.transmit_now(frame, tx_id)
+        except Exception as e:
+            logger.error("Error sending tester present: %s", e)
@@ -0,0 +1,106 @@
+import logging
+import sys
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('ecupath')
+logger.addHandler(logging.NullHandler())
+
+# Hot-path guards. Read them as module attributes (`log.TRACE`), never import
+# the names, so `configure` can flip them at runtime:
+#     if log.TRACE:
+#         log.trace("Received 0x%X %s", arbitration_id, data)
+# With TRACE off a frame costs one attribute lookup and no call.
+TRACE = True
+# Also pass every trace record to the 'ecupath' logger at DEBUG
+TRACE_TO_LOGGER = False
+
+RING_SIZE = 4096
+_ring = deque(maxlen=RING_SIZE)
+_handlers = []
+
+
+def trace(msg, *args):
+    """
+    Records a per-frame debug message in the ring buffer. Nothing is
+    formatted here; `msg % args` only runs if the buffer is dumped.
+    """
+    _ring.append((time.time(), threading.current_thread().name, msg, args))
+    if TRACE_TO_LOGGER:
+        logger.debug(msg, *args)
+
+
+def format_args(args):
+    return tuple(bytes(arg).hex(' ').upper() if isinstance(arg, (bytes, bytearray, memoryview)) else arg
+                 for arg in args)
+
+
+def format_trace(entry):
+    created, thread_name, msg, args = entry
+    stamp = time.strftime('%H:%M:%S', time.localtime(created))
+    try:
+        text = msg % format_args(args) if args else msg
+    except (TypeError, ValueError):
+        text = f"{msg} {args}"
+    return f"{stamp}.{int(created * 1000) % 1000:03d} [{thread_name}] {text}"
+
+
+def trace_records():
+    return [format_trace(entry) for entry in list(_ring)]
+
+
+def dump_trace(stream=None, clear=True):
+    """
+    Writes the buffered trace records, oldest first, and returns how many
+    were written. Clearing means a second error does not repeat them.
+    """
+    entries = list(_ring)
+    if clear:
+        _ring.clear()
+    stream = stream or sys.stderr
+    stream.write(f"--- last {len(entries)} trace records ---\n")
+    for entry in entries:
+        stream.write(format_trace(entry) + "\n")
+    stream.write("--- end of trace ---\n")
+    stream.flush()
+    return len(entries)
+
+
+class TraceDumpHandler(logging.Handler):
+    """
+    Dumps the trace ring buffer whenever an ERROR or worse is logged,
+    so the frames leading up to a failure are on hand.
+    """
+
+    def __init__(self, stream=None, level=logging.ERROR):
+        super().__init__(level)
+        self.stream = stream
+
+    def emit(self, record):
+        if _ring:
+            dump_trace(self.stream)
+
+
+def configure(level=logging.INFO, trace=True, trace_to_logger=False, ring_size=RING_SIZE, stream=None,
+              dump_on_error=True):
+    """
+    Sets up console logging for the 'ecupath' logger and the trace buffer.
+    Safe to call again, e.g. to turn tracing on or off while running.
+    """
+    global TRACE, TRACE_TO_LOGGER, _ring
+    TRACE = trace
+    TRACE_TO_LOGGER = trace and trace_to_logger
+    if ring_size != _ring.maxlen:
+        _ring = deque(_ring, maxlen=ring_size)
+    for handler in _handlers:
+        logger.removeHandler(handler)
+    _handlers.clear()
+    console = logging.StreamHandler(stream)
+    console.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s %(name)s: %(message)s'))
+    _handlers.append(console)
+    if dump_on_error:
+        _handlers.append(TraceDumpHandler(stream))
+    for handler in _handlers:
+        logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG if TRACE_TO_LOGGER else level)
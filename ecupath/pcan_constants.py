@@ -95,4 +95,12 @@ PCAN_MESSAGE_TYPES = {
     "PCAN_MESSAGE_ECHO": PCAN_MESSAGE_ECHO,    
     "PCAN_MESSAGE_ERRFRAME": PCAN_MESSAGE_ERRFRAME,
     "PCAN_MESSAGE_STATUS": PCAN_MESSAGE_STATUS
+}
+
+# Nominal/data bit rate strings for InitializeFD, based on the 80 MHz clock of PCAN-USB FD devices
+PCAN_FD_BIT_RATES = {
+    "PCAN_BAUD_500K_2M": b"f_clock_mhz=80, nom_brp=10, nom_tseg1=12, nom_tseg2=3, nom_sjw=1, data_brp=4, data_tseg1=7, data_tseg2=2, data_sjw=1",
+    "PCAN_BAUD_500K_4M": b"f_clock_mhz=80, nom_brp=10, nom_tseg1=12, nom_tseg2=3, nom_sjw=1, data_brp=2, data_tseg1=7, data_tseg2=2, data_sjw=1",
+    "PCAN_BAUD_250K_2M": b"f_clock_mhz=80, nom_brp=20, nom_tseg1=12, nom_tseg2=3, nom_sjw=1, data_brp=4, data_tseg1=7, data_tseg2=2, data_sjw=1",
+    "PCAN_BAUD_1M_4M": b"f_clock_mhz=80, nom_brp=5, nom_tseg1=12, nom_tseg2=3, nom_sjw=1, data_brp=2, data_tseg1=7, data_tseg2=2, data_sjw=1"
 }
\ No newline at end of file
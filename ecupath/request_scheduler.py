@@ -0,0 +1,179 @@
+from .UDSException import UDSException
+from .timer_wheel import TimerWheel
+from collections import deque
+from concurrent.futures import Future
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Bytes after the SID that a positive response echoes from its request
+ECHO_LENGTHS = {
+    0x10: 1, 0x11: 1, 0x19: 1, 0x27: 1, 0x28: 1, 0x3E: 1, 0x85: 1,
+    0x22: 2, 0x2E: 2, 0x2F: 2,
+    0x31: 3
+}
+# Services whose first parameter is a sub-function, with bit 7 as suppressPosRspMsgIndicationBit
+SUBFUNCTION_SERVICES = {0x10, 0x11, 0x27, 0x28, 0x31, 0x3E, 0x85}
+
+
+def response_matches(request, response):
+    sid = request[0]
+    if response[0] == 0x7F:
+        return len(response) >= 2 and response[1] == sid
+    if response[0] != sid + 0x40:
+        return False
+    for i in range(1, min(1 + ECHO_LENGTHS.get(sid, 0), len(request), len(response))):
+        expected = request[i] & 0x7F if i == 1 and sid in SUBFUNCTION_SERVICES else request[i]
+        if response[i] != expected:
+            return False
+    return True
+
+
+def suppresses_response(request):
+    return request[0] in SUBFUNCTION_SERVICES and len(request) > 1 and bool(request[1] & 0x80)
+
+
+class PendingRequest:
+    __slots__ = ('request', 'future', 'immediate', 'timer')
+
+    def __init__(self, request, immediate):
+        self.request = request
+        self.future = Future()
+        self.immediate = immediate
+        self.timer = None
+
+
+class RequestScheduler:
+    """
+    Sends one ECU's requests and resolves a Future for each. Queued requests
+    go out one at a time, and the next one leaves as soon as the previous
+    response is in. Immediate requests (session start, Tester Present)
+    skip the queue and can be in flight alongside it, because responses
+    are matched by SID and echoed sub-function or identifier. A waiter in
+    `future.result()` sleeps on the Future's condition variable and wakes
+    when the response is matched. P2/P2* run on the shared TimerWheel
+    thread, not a thread per request.
+
+    `uds` provides transmit_request, ready_for, response_timeout,
+    p2_star_timer and request_failed.
+    """
+
+    def __init__(self, uds):
+        self.uds = uds
+        self.timer_wheel = TimerWheel.shared()
+        self._lock = threading.RLock()
+        self._queue = deque()
+        self._in_flight = []
+
+    def submit(self, request, immediate=False):
+        pending = PendingRequest(request, immediate)
+        with self._lock:
+            if immediate:
+                self._send(pending)
+            else:
+                self._queue.append(pending)
+                self.pump()
+        return pending.future
+
+    @property
+    def busy(self):
+        # True while a queued request waits for its response
+        return any(not pending.immediate for pending in self._in_flight)
+
+    @property
+    def queued(self):
+        return len(self._queue)
+
+    def pump(self):
+        with self._lock:
+            while self._queue and not self.busy and self.uds.ready_for(self._queue[0].request):
+                self._send(self._queue.popleft())
+
+    def _send(self, pending):
+        if not pending.future.set_running_or_notify_cancel():
+            return
+        if suppresses_response(pending.request):
+            self.uds.transmit_request(pending.request)
+            pending.future.set_result(None)
+            return
+        self._in_flight.append(pending)
+        self._arm(pending, self.uds.response_timeout(pending.request))
+        self.uds.transmit_request(pending.request)
+
+    def _arm(self, pending, timeout):
+        TimerWheel.cancel(pending.timer)
+        pending.timer = self.timer_wheel.schedule(timeout, self._on_timeout, pending)
+
+    def _find(self, response):
+        for pending in self._in_flight:
+            if response_matches(pending.request, response):
+                return pending
+        return None
+
+    def claims(self, response):
+        """True if `response` answers a request in flight."""
+        with self._lock:
+            return self._find(response) is not None
+
+    def extend(self, response):
+        """Handles NRC 0x78: the matching request now has P2* to complete."""
+        with self._lock:
+            pending = self._find(response)
+            if pending is not None:
+                self._arm(pending, self.uds.p2_star_timer)
+        return pending
+
+    def take(self, response):
+        """Removes and returns the request `response` answers, or None."""
+        with self._lock:
+            pending = self._find(response)
+            if pending is None:
+                return None
+            self._in_flight.remove(pending)
+            TimerWheel.cancel(pending.timer)
+        return pending
+
+    def resolve(self, pending, response):
+        if response[0] == 0x7F:
+            pending.future.set_exception(UDSException.create_exception(response[2]))
+        else:
+            pending.future.set_result(response)
+        self.pump()
+
+    def fail(self, pending, error):
+        with self._lock:
+            if pending not in self._in_flight:
+                return
+            self._in_flight.remove(pending)
+            TimerWheel.cancel(pending.timer)
+        self.uds.request_failed(pending.request, error)
+        pending.future.set_exception(error)
+        self.pump()
+
+    def fail_oldest(self, error):
+        with self._lock:
+            pending = self._in_flight[0] if self._in_flight else None
+        if pending is not None:
+            self.fail(pending, error)
+        return pending
+
+    def fail_queued(self, error):
+        with self._lock:
+            queued, self._queue = list(self._queue), deque()
+        for pending in queued:
+            if pending.future.set_running_or_notify_cancel():
+                pending.future.set_exception(error)
+
+    def _on_timeout(self, pending):
+        self.fail(pending, TimeoutError(f"No response to {bytes(pending.request).hex(' ')}"))
+
+    def cancel_all(self, reason):
+        with self._lock:
+            in_flight, self._in_flight = self._in_flight, []
+            queued, self._queue = list(self._queue), deque()
+        for pending in in_flight:
+            TimerWheel.cancel(pending.timer)
+            pending.future.set_exception(ConnectionError(reason))
+        for pending in queued:
+            pending.future.cancel()
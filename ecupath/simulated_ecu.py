@@ -0,0 +1,174 @@
+from .Interface import Loopback
+from .frame import Frame
+import threading
+
+
+class SimulatedECU:
+    """
+    Minimal UDS server on a loopback bus, so the tester stack can run
+    request/response round trips without hardware. Requests are reassembled
+    with ISO-TP and answered from `handlers` (SID -> function returning the
+    response bytes, or None to stay silent). Responses are sent back without
+    any pacing, so transfers run at CPU speed.
+    """
+    RECEIVE_TIMEOUT = 0.1
+
+    def __init__(self, channel='loopback', rx_id=0x720, tx_id=0x728, message_type='standard', dids=None, dtcs=None,
+                 functional_id=None):
+        self.interface = Loopback(channel, None, message_type)
+        self.rx_id = rx_id
+        self.tx_id = tx_id
+        self.functional_id = functional_id
+        self.interface.set_filters({rx_id} if functional_id is None else {rx_id, functional_id})
+        self.tx_dl = Frame.FD_DL if self.interface.is_fd else Frame.CLASSIC_DL
+        self.dids = {did: bytes(value) for did, value in (dids or {}).items()}
+        # (3-byte DTC number, status byte) pairs reported by 0x19 0x02
+        self.dtcs = list(dtcs or [])
+        self.handlers = {
+            0x10: self.diagnostic_session_control,
+            0x19: self.read_dtc_information,
+            0x22: self.read_data_by_identifier,
+            0x2E: self.write_data_by_identifier,
+            0x3E: self.tester_present
+        }
+        self.requests_handled = 0
+        self.frame = Frame()
+        self._request = None
+        self._request_length = 0
+        self._request_sn = 0
+        self._response = None
+        self._response_offset = 0
+        self._response_sn = 0
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def close(self):
+        self.stop()
+        self.interface.close()
+
+    def _run(self):
+        while self._running:
+            for frame in self.interface.receive_frames(64, self.RECEIVE_TIMEOUT):
+                self.process_frame(frame.data)
+
+    def process_frame(self, data):
+        frame_type = data[0] >> 4
+        if frame_type == Frame.SINGLE_FRAME:
+            self.handle_request(bytes(Frame.single_frame_payload(data)))
+        elif frame_type == Frame.FIRST_FRAME:
+            if len(data) < Frame.CLASSIC_DL or not Frame.valid_first_frame_length(data, self.frame.extract_length(data)):
+                return
+            self._request_length = self.frame.extract_length(data)
+            self._request = bytearray(data[Frame.first_frame_header_size(data):])
+            self._request_sn = 1
+            self.send(self.frame.construct_flow_control(0, 0))
+        elif frame_type == Frame.CONSECUTIVE_FRAME and self._request is not None:
+            if data[0] & 0x0F != self._request_sn:
+                self._request = None
+                return
+            self._request_sn = (self._request_sn + 1) & 0x0F
+            self._request += bytes(data[1:])
+            if len(self._request) >= self._request_length:
+                request = bytes(self._request[:self._request_length])
+                self._request = None
+                self.handle_request(request)
+        elif frame_type == Frame.FLOW_CONTROL_FRAME and self._response is not None:
+            flow_status = data[0] & 0x0F
+            if flow_status == Frame.FC_CONTINUE_TO_SEND:
+                self.send_consecutive_frames(data[1])
+            elif flow_status == Frame.FC_OVERFLOW:
+                self._response = None
+
+    def handle_request(self, request):
+        self.requests_handled += 1
+        handler = self.handlers.get(request[0])
+        if handler is None:
+            response = self.negative_response(request[0], 0x11)
+        else:
+            response = handler(request)
+        if response:
+            self.send_response(response)
+
+    def send(self, frame):
+        self.interface.send_frame(self.tx_id, frame)
+
+    def send_response(self, response):
+        if len(response) <= Frame.max_single_frame_length(self.tx_dl):
+            self.send(Frame.construct_single_frame(response))
+            return
+        first_frame = Frame.construct_first_frame(len(response), response, self.tx_dl)
+        self._response = memoryview(bytes(response))
+        self._response_offset = len(first_frame) - Frame.first_frame_header_size(first_frame)
+        self._response_sn = 1
+        self.send(first_frame)
+
+    def send_consecutive_frames(self, block_size):
+        cf_size = self.tx_dl - 1
+        sent = 0
+        while self._response_offset < len(self._response) and (block_size == 0 or sent < block_size):
+            chunk = self._response[self._response_offset:self._response_offset + cf_size]
+            self.send(Frame.construct_consecutive_frame(self._response_sn, chunk))
+            self._response_offset += len(chunk)
+            self._response_sn = (self._response_sn + 1) & 0x0F
+            sent += 1
+        if self._response_offset >= len(self._response):
+            self._response = None
+
+    @staticmethod
+    def negative_response(sid, nrc):
+        return bytes((0x7F, sid, nrc))
+
+    def diagnostic_session_control(self, request):
+        # P2 = 50 ms and P2* = 5000 ms, in the units UDS.update_timers expects
+        return bytes((0x50, request[1], 0x00, 0x32, 0x13, 0x88))
+
+    def tester_present(self, request):
+        if len(request) > 1 and request[1] & 0x80:
+            return None
+        return bytes((0x7E, 0x00))
+
+    def read_data_by_identifier(self, request):
+        response = bytearray((0x62,))
+        for i in range(1, len(request) - 1, 2):
+            did = request[i] << 8 | request[i + 1]
+            if did not in self.dids:
+                return self.negative_response(0x22, 0x31)
+            response += request[i:i + 2] + self.dids[did]
+        if len(response) == 1:
+            return self.negative_response(0x22, 0x13)
+        return bytes(response)
+
+    def write_data_by_identifier(self, request):
+        if len(request) < 4:
+            return self.negative_response(0x2E, 0x13)
+        self.dids[request[1] << 8 | request[2]] = bytes(request[3:])
+        return bytes((0x6E, request[1], request[2]))
+
+    def read_dtc_information(self, request):
+        if len(request) >= 6 and request[1] in (0x04, 0x06):
+            # Snapshot or extended data for one DTC; no records are stored, so only the header comes back
+            dtc = int.from_bytes(request[2:5], 'big')
+            status = dict(self.dtcs).get(dtc)
+            if status is None:
+                return self.negative_response(0x19, 0x31)
+            return bytes((0x59, request[1])) + request[2:5] + bytes((status,))
+        if len(request) < 3 or request[1] != 0x02:
+            return self.negative_response(0x19, 0x12)
+        response = bytearray((0x59, 0x02, 0xFF))
+        for dtc, status in self.dtcs:
+            if status & request[2]:
+                response += dtc.to_bytes(3, 'big') + bytes((status,))
+        return bytes(response)
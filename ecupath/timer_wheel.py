@@ -0,0 +1,113 @@
+import heapq
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TimerHandle:
+    __slots__ = ('callback', 'args', 'deadline', 'cancelled')
+
+    def __init__(self, callback, args, deadline):
+        self.callback = callback
+        self.args = args
+        # Absolute tick the timer fires on
+        self.deadline = deadline
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel driven by a single thread. Scheduling and cancelling
+    are O(1), so protocol timers can be armed and disarmed on every frame
+    without creating a thread per timeout. The thread sleeps until the
+    nearest deadline, so a few long timers do not wake it every tick.
+    Cancelled timers are dropped when their slot comes up.
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, tick=0.001, slots=512):
+        self.tick = tick
+        self._slots = [[] for _ in range(slots)]
+        self._pending = 0
+        # Min-heap of the deadlines of pending timers, including cancelled ones
+        self._deadlines = []
+        self._start = time.monotonic()
+        self._current_tick = 0
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def schedule(self, delay, callback, *args):
+        with self._condition:
+            elapsed = time.monotonic() - self._start
+            if self._pending == 0:
+                # The wheel stops turning while idle; catch it up before using it as a reference
+                self._current_tick = int(elapsed / self.tick)
+            # Round up so a timer never fires before its delay has elapsed
+            target = max(math.ceil((elapsed + delay) / self.tick), self._current_tick + 1)
+            handle = TimerHandle(callback, args, target)
+            self._slots[target % len(self._slots)].append(handle)
+            self._pending += 1
+            heapq.heappush(self._deadlines, target)
+            if self._deadlines[0] == target:
+                # Nearer than what the thread is sleeping towards
+                self._condition.notify()
+        return handle
+
+    @staticmethod
+    def cancel(handle):
+        if handle is not None:
+            handle.cancel()
+
+    def _run(self):
+        while True:
+            expired = []
+            with self._condition:
+                while self._pending == 0:
+                    self._condition.wait()
+                now = time.monotonic()
+                now_tick = int((now - self._start) / self.tick)
+                if now_tick < self._deadlines[0]:
+                    # A nearer timer scheduled meanwhile wakes us early, so look again either way
+                    self._condition.wait(max(self._start + self._deadlines[0] * self.tick - now, self.tick / 10))
+                    continue
+                # Only the last len(slots) ticks can hold anything due; older slots were visited already
+                first_tick = max(self._current_tick + 1, now_tick - len(self._slots) + 1)
+                for tick in range(first_tick, now_tick + 1):
+                    slot = self._slots[tick % len(self._slots)]
+                    if not slot:
+                        continue
+                    remaining = []
+                    for handle in slot:
+                        if handle.cancelled:
+                            self._pending -= 1
+                        elif handle.deadline > now_tick:
+                            remaining.append(handle)
+                        else:
+                            self._pending -= 1
+                            expired.append(handle)
+                    slot[:] = remaining
+                self._current_tick = max(self._current_tick, now_tick)
+                while self._deadlines and self._deadlines[0] <= self._current_tick:
+                    heapq.heappop(self._deadlines)
+            # Callbacks run outside the lock so they can schedule new timers
+            for handle in expired:
+                if not handle.cancelled:
+                    try:
+                        handle.callback(*handle.args)
+                    except Exception as e:
+                        logger.exception("Timer callback failed: %s", e)
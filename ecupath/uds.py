@@ -1,13 +1,19 @@
 from .can_tp import CAN_TP
+from .did_cache import DidCache
+from .functional import FunctionalClient
 from .event_manager import EventManager
 from .UDSException import UDSException
 from .frame import Frame
+from .keep_alive import KeepAliveScheduler
+from .request_scheduler import RequestScheduler
 from .uds_sid_19 import Ox19
 from .uds_sid_22 import Ox22
 from .uds_sid_2E import Ox2E
+from collections import deque
+import logging
 import queue
-import threading
-import time
+
+logger = logging.getLogger(__name__)
 
 class UDS:
     START_SESSION = (0x10, 0x03)
@@ -23,10 +29,12 @@ class UDS:
         self.can_tp = CAN_TP(interface, tx_id, channel, baud_rate, message_type, event_manager)
         self.event_manager.publish('rx_id', rx_id)
         self.event_manager.subscribe('data_to_uds', self.process_response)
-        self._buffer_to_cantp = queue.Queue()
+        self.event_manager.subscribe('cantp_error', self.process_transport_error)
+        self.event_manager.subscribe('cantp_transmission', self.process_transmission)
         self._sid_output_display = queue.Queue()
         self._output_terminal = queue.Queue()
         self.frame = Frame()
+        self.did_cache = DidCache()
         self.handlers = {
             0x19: Ox19(self),
             0x22: Ox22(self),
@@ -34,12 +42,24 @@ class UDS:
         }
         self.p2_timer = 0.05
         self.p2_star_timer = 5
-        self.waiting_for_response = False
-        self.response_pending = False
         self.current_request = None
         self.session_started = False
-        self.request_lock = threading.Lock()
-        self._immediate_request_queue = queue.Queue()
+        self.scheduler = RequestScheduler(self)
+        self.keep_alive = KeepAliveScheduler(self.can_tp.can, is_busy=self.can_tp.transmitting)
+        # Request -> response latencies from hardware receive timestamps
+        self.response_latencies = deque(maxlen=1024)
+        self.p2_violations = 0
+        self._p2_reference = None
+
+    def close(self):
+        # Releases the hardware channel, so the stack cannot be used afterwards
+        self.keep_alive.stop_all()
+        self.session_started = False
+        self.scheduler.cancel_all("UDS closed")
+        self.event_manager.unsubscribe('data_to_uds', self.process_response)
+        self.event_manager.unsubscribe('cantp_error', self.process_transport_error)
+        self.event_manager.unsubscribe('cantp_transmission', self.process_transmission)
+        self.can_tp.close()
 
     def update_interface(self, interface, tx_id, rx_id, channel, baud_rate, message_type):
         self.interface = interface
@@ -48,166 +68,193 @@ class UDS:
         self.channel = channel
         self.baud_rate = baud_rate
         self.message_type = message_type
+        self.keep_alive.stop_all()
+        self.session_started = False
+        self.scheduler.cancel_all("Interface changed")
         self.can_tp.update_interface(interface, tx_id, channel, baud_rate, message_type)
+        self.event_manager.publish('rx_id', rx_id)
 
     def start_session(self):
         if not self.session_started:
-            print("Starting diagnostic session")
-            self.send_request(self.START_SESSION, immediate=True)
+            logger.info("Starting diagnostic session")
+            future = self.send_request(self.START_SESSION, immediate=True)
             self.session_started = True
+            return future
+
+    def end_session(self):
+        self.session_started = False
+        self.did_cache.clear()
+        # Queued requests only leave once a session is open, so they would otherwise wait forever
+        self.scheduler.fail_queued(ConnectionError("Diagnostic session ended"))
+        self.keep_alive.stop(self.tx_id)
 
     def send_request(self, data, immediate=False):
-        self.received_data = data
-        self._output_terminal.put(self.received_data)
-        with self.request_lock:
-            if immediate:
-                self._immediate_request_queue.put(self.received_data)
-                self.process_immediate_request()
-            elif not self.session_started and self.received_data != self.START_SESSION:
-                print("Queueing request.")
-                self._buffer_to_cantp.put(self.received_data)
-            elif self.waiting_for_response:
-                print("Waiting for response, queueing new request")
-                self._buffer_to_cantp.put(self.received_data)
-            else:
-                self.prepare_and_send_request(self.received_data)
-
-    def process_immediate_request(self):
-        while not self._immediate_request_queue.empty():
-            data = self._immediate_request_queue.get()
-            print(f"Sending immediate request: {data}")
-            self.can_tp.receive_data_from_uds(data)
-
-    def prepare_and_send_request(self, data):
+        """
+        Queues `data` for the ECU and returns a concurrent.futures.Future.
+        It resolves to the positive response (None when the request
+        suppresses it), or raises the UDSException for an NRC, TimeoutError
+        after P2/P2* or ConnectionError if the transport gives up.
+        Until the session is started, only START_SESSION leaves the queue.
+        Immediate requests skip the queue.
+        """
+        self._output_terminal.put(data)
+        if not immediate and self.scheduler.busy:
+            logger.debug("Waiting for response, queueing request %s", data)
+        return self.scheduler.submit(data, immediate)
+
+    def open_functional(self, ecus=None, functional_id=FunctionalClient.FUNCTIONAL_ID):
+        """
+        Returns a FunctionalClient on this bus using the current P2/P2*.
+        `ecus` maps each ECU's response ID to its physical request ID
+        and defaults to the OBD range 0x7E8-0x7EF. Responses on this
+        client's own response ID reach it only when they answer one of
+        its requests in flight.
+        """
+        return FunctionalClient(self.can_tp, ecus, functional_id, self.p2_timer, self.p2_star_timer,
+                                {self.rx_id: self.scheduler.claims})
+
+    def read_dids(self, dids, timeout=None, use_cache=True):
+        """Bulk ReadDataByIdentifier, see Ox22.read_dids."""
+        return self.handlers[0x22].read_dids(dids, timeout, use_cache)
+
+    @property
+    def waiting_for_response(self):
+        return self.scheduler.busy
+
+    def ready_for(self, request):
+        return self.session_started or tuple(request) == self.START_SESSION
+
+    def response_timeout(self, request):
+        return self.p2_star_timer if tuple(request) == self.START_SESSION else self.p2_timer
+
+    def transmit_request(self, data):
         self.current_request = data
-        self.waiting_for_response = True
-        self.response_pending = False
-        print(f"Sending request: {data}")
+        self._p2_reference = None
+        logger.debug("Sending request: %s", data)
         self.can_tp.receive_data_from_uds(data)
-        threading.Thread(target=self.response_timeout_handler).start()
+
+    def request_failed(self, request, error):
+        logger.error("Request %s failed: %s", request, error)
+        if tuple(request) == self.START_SESSION:
+            self.end_session()
 
     def process_request_queue(self):
-        with self.request_lock:
-            self.process_immediate_request()
-            if not self.waiting_for_response and not self._buffer_to_cantp.empty():
-                request = self._buffer_to_cantp.get()
-                self.prepare_and_send_request(request)
+        self.scheduler.pump()
 
     def process_response(self, response):
         self.received_response = response
         self._output_terminal.put(self.received_response)
         try:
-            print("process_response", self.received_response)
-            if self.received_response[0] == '0x7F':
-                if self.received_response[2] == '0x78':
-                    print("Received ResponsePending (0x78)")
-                    self.response_pending = True
-                    threading.Thread(target=self.wait_for_response).start()
-                else:
-                    self.handle_response(self.received_response)
-            else:
-                self.handle_response(self.received_response)
+            logger.debug("Response: %s", self.received_response)
+            if response[0] == 0x7F and len(response) >= 3 and response[2] == 0x78:
+                logger.debug("Received ResponsePending (0x78)")
+                if self.scheduler.extend(response) is not None:
+                    self.check_response_timing(response)
+                return
+            pending = self.scheduler.take(response)
+            if pending is None:
+                # Late or unsolicited: there is no request to attribute it to, so it changes no state
+                logger.info("Ignoring response %s that matches no outstanding request", bytes(response).hex(' '))
+                return
+            self.check_response_timing(response)
+            try:
+                self.handle_response(response, pending.request)
+            finally:
+                # Side effects such as session state are in place before any waiter wakes up
+                if pending is not None:
+                    self.scheduler.resolve(pending, response)
         except Exception as e:
-            print(f"Unexpected Error: {e}")
-
-    def handle_response(self, response):
-        with self.request_lock:
-            print("handle response")
-            self.waiting_for_response = False
-            self.response_pending = False
-            if response[0] == '0x50':
-                print("received session positive response")
-                self.update_timers(response)
-                print("Diagnostic session started successfully")
-                self.session_started = True
-                self.process_queued_requests()
-            elif response[0] == '0x7E':
-                print("received session positive response")
-                self.update_timers(response)
-                print("Tester Present")
-                self.session_started = True
-                self.process_queued_requests()
-            elif response[0] == '0x7F':
-                print("Negative Response Detected:", response)
-                nrc = response[2]
-                print("NRC:", nrc)
-                if self.current_request == self.START_SESSION:
-                    self.session_started = False
-                print(UDSException.create_exception(nrc))
-            else:
-                self.direct_to_sid(response)
-                self.process_request_queue()
+            logger.exception("Unexpected error handling response: %s", e)
+
+    def check_response_timing(self, response):
+        channel = self.can_tp.default_channel
+        timing = channel.last_message_timing if channel is not None else None
+        if timing is None or timing['first_frame'] is None:
+            return
+        # After a 0x78 the next response is due within P2* of that 0x78, not of the request
+        reference = self._p2_reference or timing['request_sent']
+        if reference is None:
+            return
+        latency = timing['first_frame'] - reference
+        limit = self.p2_star_timer if self._p2_reference is not None else self.p2_timer
+        self.response_latencies.append(latency)
+        if latency > limit:
+            self.p2_violations += 1
+            logger.warning("Response after %.3f ms exceeds %.0f ms", latency * 1000, limit * 1000)
+        pending = len(response) >= 3 and response[0] == 0x7F and response[2] == 0x78
+        self._p2_reference = timing['first_frame'] if pending else None
+
+    def timing_statistics(self):
+        latencies = list(self.response_latencies)
+        return {
+            'responses': len(latencies),
+            'min_latency': min(latencies) if latencies else None,
+            'max_latency': max(latencies) if latencies else None,
+            'mean_latency': sum(latencies) / len(latencies) if latencies else None,
+            'p2_violations': self.p2_violations,
+            'transport': self.can_tp.timing_statistics()
+        }
+
+    def process_transport_error(self, error):
+        # A transfer aborted by ISO-TP will never complete, so release the request slot right away
+        if error['rx_id'] != self.rx_id:
+            return
+        self.scheduler.fail_oldest(ConnectionError(f"Transport layer: {error['reason']}"))
+
+    def process_transmission(self, state):
+        # A hardware keep-alive cannot be deferred, so it is held while a request is segmented
+        if state['tx_id'] != self.tx_id:
+            return
+        if state['active']:
+            self.keep_alive.hold(self.tx_id)
+        elif not self.can_tp.transmitting(self.tx_id):
+            self.keep_alive.release(self.tx_id)
+
+    def handle_response(self, response, request=None):
+        if response[0] == 0x50:
+            self.update_timers(response)
+            # Values cached for the session may differ in the new one
+            self.did_cache.clear()
+            logger.info("Diagnostic session started successfully")
+            self.session_started = True
+            self.keep_alive.start(self.tx_id)
+        elif response[0] == 0x7E:
+            self.update_timers(response)
+            logger.debug("Tester present response")
+            self.session_started = True
+        elif response[0] == 0x51:
+            self.did_cache.clear()
+            logger.info("ECU reset, cached DID values dropped")
+        elif response[0] == 0x7F:
+            nrc = response[2]
+            logger.warning("Negative response %s: %s", bytes(response).hex(' '), UDSException.create_exception(nrc))
+            if request is not None and tuple(request) == self.START_SESSION:
+                self.end_session()
+        else:
+            self.direct_to_sid(response)
+
     def update_timers(self, response):
-        print("UPDATE TIMERS")
         if len(response) >= 4:
-            self.p2_timer = (int(response[2], 16) << 8 | int(response[3], 16)) / 1000
+            self.p2_timer = (response[2] << 8 | response[3]) / 1000
         if len(response) >= 6:
-            self.p2_star_timer = (int(response[4], 16) << 8 | int(response[5], 16)) / 1000
-        print(f"Updated timers - P2: {self.p2_timer}s, P2*: {self.p2_star_timer}s")
-
-    def wait_for_response(self):
-        timeout = self.p2_star_timer
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            if not self.response_pending:
-                return
-            time.sleep(0.01)
-        print(f"Timeout occurred while waiting for response after 0x78")
-        self.waiting_for_response = False
-        self.response_pending = False
-        self.process_request_queue()
-
-    def response_timeout_handler(self):
-        timeout = self.p2_timer if self.current_request != self.START_SESSION else self.p2_star_timer
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            if not self.waiting_for_response or self.response_pending:
-                return
-            time.sleep(0.1)
-        if self.waiting_for_response and not self.response_pending:
-            print(f"Timeout occurred while waiting for response to {self.current_request}")
-            self.waiting_for_response = False
-            if self.current_request == self.START_SESSION:
-                self.session_started = False
+            self.p2_star_timer = (response[4] << 8 | response[5]) / 1000
+        logger.info("Updated timers - P2: %ss, P2*: %ss", self.p2_timer, self.p2_star_timer)
 
     def direct_to_sid(self, response):
         self.Frame_response = response
-        print("direct_to_sid", self.Frame_response)
         self.sid = self.frame.get_sid(self.Frame_response)
-        print("sid received: ", self.sid)
 
         # Check if the SID is 0x62 (Tester Present) and ignore it
         if self.sid == 0x62:
-            print("Ignoring Tester Present response (SID 0x62)")
-            self.process_request_queue()  # Continue processing the request queue
+            logger.debug("Ignoring Tester Present response (SID 0x62)")
             return
 
         handler = self.handlers.get(self.sid)
         if handler:
             handler.buffer_frame(self.Frame_response)
         else:
-            print(f"No handler for SID {self.sid}")
-
-    def process_next_request(self):
-        if not self.waiting_for_response and not self._buffer_to_cantp.empty():
-            request = self._buffer_to_cantp.get()
-            print(f"Sending request: {request}")
-            self.can_tp.receive_data_from_uds(request)
-            self.waiting_for_response = True
-            self.response_pending = False
-            threading.Thread(target=self.response_timeout_handler).start()
-        
+            logger.warning("No handler for SID 0x%02X", self.sid)
+
     def added_from_sid(self, data):
         self.event_manager.publish('response_received', data)
-        self._sid_output_display.put(data)
-
-    def process_queued_requests(self):
-        while not self._buffer_to_cantp.empty():
-            with self.request_lock:
-                if not self.waiting_for_response:
-                    request = self._buffer_to_cantp.get()
-                    self.prepare_and_send_request(request)
-                else:
-                    break  # Stop processing if waiting for a response
-            while self.waiting_for_response:
-                time.sleep(0.01)
\ No newline at end of file
+        self._sid_output_display.put(data)
\ No newline at end of file
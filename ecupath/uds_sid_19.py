@@ -1,10 +1,12 @@
+import logging
 import queue
-from . import Colors
 from rich.table import Table
 from rich.console import Console
 from io import StringIO
 from .frame import Frame
 
+logger = logging.getLogger(__name__)
+
 class Ox19:
 
     def __init__(self, uds_instance):
@@ -36,26 +38,25 @@ class Ox19:
     def main(self):
         if not self._buffer.empty():
             self.data = self._buffer.get()
-            subfunction = int(self.data[1], 16)
+            subfunction = self.data[1]
             handler = self.subfunction_handlers.get(subfunction)
             if handler:
                 handler(self.data[2:])
             else:
-                print(f"Unsupported subfunction: {hex(subfunction)}")
+                logger.warning("Unsupported subfunction: 0x%02X", subfunction)
 
     # subfunction 0x02
     def handle_reportDTCByStatusMask(self, data):
         self.data = data[1:]
-        print(f"Handling reportDTCByStatusMask (0x02): {self.data}")
-        print(f"{Colors.green}{self.data}{Colors.reset}")
+        logger.debug("Handling reportDTCByStatusMask (0x02): %s", self.data)
         self.decoder(self.data)
 
     # subfunction 0x13
     def handle_reportEmissionsOBDDTCByStatusMask(self, data):
-        print(f"Handling reportEmissionsOBDDTCByStatusMask (0x13): {data}")
+        logger.debug("Handling reportEmissionsOBDDTCByStatusMask (0x13): %s", data)
         # Extract DTCStatusAvailabilityMask
         dtc_status_availability_mask = data[0]
-        print(f"DTCStatusAvailabilityMask: {hex(dtc_status_availability_mask)}")
+        logger.debug("DTCStatusAvailabilityMask: 0x%02X", dtc_status_availability_mask)
 
         # Process DTCs
         dtcs = data[1:]
@@ -80,10 +81,21 @@ class Ox19:
             console.print(self.table)
             table_string = buffer.getvalue()
 
-        print(table_string)
+        logger.info("\n%s", table_string)
         self.uds.added_from_sid(table_string)
 
-    def decode_dtc_status(self, status):
+    @staticmethod
+    def parse_dtc_records(data):
+        """Splits DTCAndStatusRecords into (3-byte DTC, status) pairs."""
+        return [(data[i] << 16 | data[i + 1] << 8 | data[i + 2], data[i + 3]) for i in range(0, len(data) - 3, 4)]
+
+    @staticmethod
+    def dtc_system(dtc):
+        # The top two bits of the DTC select P, C, B or U codes
+        return ('Power Train', 'Chassis', 'Body', 'Network')[dtc >> 22 & 0x03]
+
+    @staticmethod
+    def decode_dtc_status(status):
         status_bits = {
             0: "testFailed",
             1: "testFailedThisOperationCycle",
@@ -103,26 +115,14 @@ class Ox19:
         return " | ".join(active_statuses) if active_statuses else "No active status" 
        
     def decoder(self, received_data) -> None:
-        print("decode_table")
         self.table = Table(title="Hex Values and Status Mask")
         self.table.add_column("Hex Values", justify="left")
         self.table.add_column("Status/Counter/Snapshot Record Number", justify="left")
         self.console = Console()
 
-        # Ensure that data contains integers
-        hex_data = self.frame.hex(received_data)
-
-        # Convert hex strings to integers if necessary
-        data = []
-        for item in hex_data:
-            if isinstance(item, str):
-                if item.startswith('0x'):
-                    item = int(item, 16)  # Convert hex string with '0x' to integer
-                else:
-                    item = int(item, 16)  # Convert plain hex string to integer
-            data.append(item)  # Append each converted item
+        # Responses arrive as bytes, so indexing already yields integers
+        data = received_data
 
-        print(f"Data length: {len(data)}")  # Debug print for data length
 
         for i in range(0, len(data), 4):
             if i + 3 < len(data):  # Ensure there are enough bytes for a complete set
@@ -131,7 +131,6 @@ class Ox19:
                 
                 hex_value_str = f"{combined_hex_value:06X}"
                 status_mask_str = f"{status_mask:02X}"
-                print("Tableee")  # Debug print to verify decode_table call
                 self.decode_table(hex_value_str, status_mask_str)
         
         # Capture the table output as a string
@@ -140,24 +139,21 @@ class Ox19:
             self.console.print(self.table)
             table_string = buffer.getvalue()
 
-        print(table_string)  # Print the captured table string
+        logger.info("\n%s", table_string)
 
         try:
             # Print to console and add to uds
             self.uds.added_from_sid(table_string)
-            print("Added table to uds bufferrrrrrrrrrrrrrrrrrrrrrrrrrrrrrrrrrrrrrrrr")
         except Exception as e:
-            print(f"Error printing table: {e}")
+            logger.error("Error adding table: %s", e)
 
     def hex_to_bin(self, hex_value):
-        print("hex_to_bin")
         if isinstance(hex_value, str):
             hex_value = int(hex_value, 16)
         binary_string = bin(hex_value)[2:].zfill(8)
         return binary_string    
 
     def decode_table(self, hex_value_str, status_mask_str) -> None:
-        print("decode_table")
         system_specific_dtc = int(hex_value_str, 16) & 0xF00000
         system_specific_value = self.hex_to_bin(system_specific_dtc)[:2]
         
@@ -197,14 +193,13 @@ class Ox19:
 
     # subfunction 0x01
     def handle_reportNumberOfDTCByStatusMask(self, data):
-        print(f"Handling reportNumberOfDTCByStatusMask (0x01): {data}")
-        print("0x01 Count: ", data[2])
+        logger.debug("Handling reportNumberOfDTCByStatusMask (0x01): %s", data)
+        logger.debug("0x01 count: %d", data[2])
         self.uds.added_from_sid(data[2])
 
     # subfunction 0x0A
     def handle_reportSupportedDTC(self, data):
-        print(f"Handling reportSupportedDTC (0x0A): {data}")
-        print(f"{Colors.green}{data}{Colors.reset}")
+        logger.debug("Handling reportSupportedDTC (0x0A): %s", data)
         self.one_column_table(data)
 
     def one_column_table(self, data):
@@ -219,7 +214,7 @@ class Ox19:
         for i in range(0, len(self.dtc_data), 3):
             group = self.dtc_data[i:i+3]
             # Join the group values with spaces
-            row_content = " ".join(group)
+            row_content = " ".join(f"{byte:02X}" for byte in group)
             self.table.add_row(row_content)
 
         #self.console.print(self.table)
@@ -229,70 +224,63 @@ class Ox19:
             self.console.print(self.table)
             string_table = s_table.getvalue()
 
-        print(string_table)  # Print the captured table string
+        logger.info("\n%s", string_table)
         self.uds.added_from_sid(string_table)
 
     # subfunction 0x12
     def reportNumberOfEmissionsOBDDTCByStatusMask(self, data):
-        print(f"Handling reportNumberOfDTCByStatusMask (0x12): {data}")
-        print("0x12 Count: ", data[2])
+        logger.debug("Handling reportNumberOfDTCByStatusMask (0x12): %s", data)
+        logger.debug("0x12 count: %d", data[2])
         self.uds.added_from_sid(data[2])
 
     # subfunction 0x11
     def reportNumberOfMirrorMemoryDTCByStatusMask(self, data):
-        print(f"Handling reportNumberOfDTCByStatusMask (0x11): {data}")
-        print("0x11 Count: ", data[2])
+        logger.debug("Handling reportNumberOfDTCByStatusMask (0x11): %s", data)
+        logger.debug("0x11 count: %d", data[2])
         self.uds.added_from_sid(data[2])
 
     # subfunction 0x0F
     def reportMirrorMemoryDTCByStatusMask(self, data):
         self.data = data[1:]
-        print(f"Handling reportNumberOfDTCByStatusMask (0x0F): {self.data}")
-        print(f"{Colors.green}{self.data}{Colors.reset}")
+        logger.debug("Handling reportNumberOfDTCByStatusMask (0x0F): %s", self.data)
         self.decoder(self.data)
 
     # subfunction 0x0B
     def reportFirstTestFailedDTC(self, data):
-        print(f"reportFirstTestFailedDTC (0x0B): {data}")
-        print(f"{Colors.green}{data}{Colors.reset}")
+        logger.debug("reportFirstTestFailedDTC (0x0B): %s", data)
         self.decoder(data)
 
     # subfunction 0x0C
     def reportFirstConfirmedDTC (self, data):
-        print(f"reportFirstConfirmedDTC (0x0C): {data}")
-        print(f"{Colors.green}{data}{Colors.reset}")
+        logger.debug("reportFirstConfirmedDTC (0x0C): %s", data)
         self.decoder(data)
 
     # subfunction 0x0D
     def reportMostRecentTestFailedDTC(self, data):
-        print(f"reportMostRecentTestFailedDTC (0x0D): {data}")
-        print(f"{Colors.green}{data}{Colors.reset}")
+        logger.debug("reportMostRecentTestFailedDTC (0x0D): %s", data)
         self.decoder(data)
 
     # subfunction 0x0E
     def reportMostRecentConfirmedDTC(self, data):
-        print(f"reportMostRecentConfirmedDTC (0x0E): {data}")
-        print(f"{Colors.green}{data}{Colors.reset}")
+        logger.debug("reportMostRecentConfirmedDTC (0x0E): %s", data)
         self.decoder(data)
 
     # subfunction 0x14
     def reportDTCFaultDetectionCounter(self, data):
-        print(f"reportDTCFaultDetectionCounter (0x14): {data}")
-        print(f"{Colors.green}{data}{Colors.reset}")
+        logger.debug("reportDTCFaultDetectionCounter (0x14): %s", data)
         self.decoder(data)
 
     # subfunction 0x15
     def reportDTCWithPermanentStatus(self, data):
-        print(f"reportDTCWithPermanentStatus (0x15): {data}")
-        print(f"{Colors.green}{data}{Colors.reset}")
+        logger.debug("reportDTCWithPermanentStatus (0x15): %s", data)
         self.decoder(data)
 
     # subfunction 0x05
     def handle_reportDTCStoredDataByRecordNumber(self, data):
-        print(f"Handling reportDTCStoredDataByRecordNumber (0x05): {data}")
+        logger.debug("Handling reportDTCStoredDataByRecordNumber (0x05): %s", data)
         
         record_number = data[0]
-        print(f"DTCStoredDataRecordNumber: {hex(record_number)}")
+        logger.debug("DTCStoredDataRecordNumber: 0x%02X", record_number)
 
         self.table = Table(title="DTC Stored Data")
         self.table.add_column("Parameter", style="cyan")
@@ -336,12 +324,11 @@ class Ox19:
             console.print(self.table)
             table_string = buffer.getvalue()
 
-        print(table_string)
+        logger.info("\n%s", table_string)
         self.uds.added_from_sid(table_string)    
     
     # subfunction 0x03
     def reportDTCSnapshotIdentification(self,data):
         self.data = data[1:]
-        print(f"Handling reportDTCSnapshotIdentification (0x03): {self.data}")
-        print(f"{Colors.green}{self.data}{Colors.reset}")
+        logger.debug("Handling reportDTCSnapshotIdentification (0x03): %s", self.data)
         self.decoder(self.data)
\ No newline at end of file
@@ -1,13 +1,24 @@
+import logging
 import queue
 from . import Colors
 from .frame import Frame
+from .UDSException import UDSException
+
+logger = logging.getLogger(__name__)
 
 class Ox22:
+    # NRCs after which a multi-DID request is retried as two smaller ones
+    SPLIT_NRCS = {0x13, 0x14, 0x31}
+    MAX_DIDS_PER_REQUEST = 64
 
     def __init__(self, uds_instance):
         self._buffer = queue.Queue()
         self.uds = uds_instance
         self.frame = Frame()
+        self.max_response_length = Frame.MAX_FF_DL
+        self.max_dids_per_request = Ox22.MAX_DIDS_PER_REQUEST
+        # DID -> data length, configured or learned from single-DID responses
+        self.did_lengths = {}
         
 
     def buffer_frame(self, frame):
@@ -16,6 +27,122 @@ class Ox22:
 
     def main(self):
         if not self._buffer.empty():
-            print("I'm in Ox22")
+            logger.debug("Handling 0x22 response")
             self.data = self._buffer.get()
-            self.uds.added_from_sid(self.data)
\ No newline at end of file
+            self.uds.added_from_sid(self.data)
+
+    @staticmethod
+    def build_request(dids):
+        request = [0x22]
+        for did in dids:
+            request += (did >> 8, did & 0xFF)
+        return tuple(request)
+
+    def pack(self, dids):
+        """
+        Groups `dids` so that each response fits in `max_response_length`.
+        A DID of unknown length gets a request of its own, because its
+        value could not be told apart from the next DID's in a shared one.
+        """
+        batches = [[did] for did in dids if did not in self.did_lengths]
+        batch, size = [], 1
+        for did in (did for did in dids if did in self.did_lengths):
+            length = 2 + self.did_lengths[did]
+            if batch and (size + length > self.max_response_length or len(batch) >= self.max_dids_per_request):
+                batches.append(batch)
+                batch, size = [], 1
+            batch.append(did)
+            size += length
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def split_response(self, response, dids):
+        """
+        Demultiplexes a 0x62 response into {did: data}. The ECU answers in
+        request order and leaves out DIDs it does not support. A single
+        DID takes the rest of the response; otherwise every length must
+        be known and the values must fill the response exactly.
+        """
+        if len(dids) == 1:
+            if len(response) < 3 or (response[1] << 8 | response[2]) != dids[0]:
+                raise ValueError(f"Response does not carry DID 0x{dids[0]:04X}")
+            return {dids[0]: bytes(response[3:])}
+        values = {}
+        remaining = list(dids)
+        pos = 1
+        while pos < len(response):
+            if pos + 2 > len(response):
+                raise ValueError("Response ends inside a DID")
+            did = response[pos] << 8 | response[pos + 1]
+            if did not in remaining:
+                raise ValueError(f"Unexpected DID 0x{did:04X} in response")
+            remaining = remaining[remaining.index(did) + 1:]
+            pos += 2
+            end = pos + self.did_lengths[did]
+            if end > len(response):
+                raise ValueError(f"Response too short for DID 0x{did:04X}")
+            values[did] = bytes(response[pos:end])
+            pos = end
+        return values
+
+    def read_dids(self, dids, timeout=None, use_cache=True):
+        """
+        Reads `dids` with as few 0x22 requests as the ECU's response length
+        allows and returns {did: data}. A request rejected with NRC
+        0x13/0x14/0x31 is split in half and retried, so only the DIDs at
+        fault end up mapped to their UDSException. A DID not yet in
+        did_lengths is read on its own once, which records its length for
+        batching next time, and a batch that does not split by the known
+        lengths is read again one DID at a time. Values still valid in the
+        UDS did_cache are not requested. Blocks until every request is
+        answered, so it must not run on the receive thread.
+        """
+        dids = list(dict.fromkeys(dids))
+        cache = self.uds.did_cache
+        results = {}
+        if use_cache:
+            for did in dids:
+                data = cache.get(did)
+                if data is not None:
+                    results[did] = data
+        missing = [did for did in dids if did not in results]
+        work = [(batch, self.uds.send_request(self.build_request(batch))) for batch in self.pack(missing)]
+        while work:
+            batch, future = work.pop(0)
+            try:
+                response = future.result(timeout)
+            except UDSException as e:
+                if len(batch) > 1 and e.nrc in self.SPLIT_NRCS:
+                    half = len(batch) // 2
+                    logger.debug("Splitting %d DIDs after NRC 0x%02X", len(batch), e.nrc)
+                    for part in (batch[:half], batch[half:]):
+                        work.append((part, self.uds.send_request(self.build_request(part))))
+                else:
+                    results.update(dict.fromkeys(batch, e))
+                continue
+            except Exception as e:
+                results.update(dict.fromkeys(batch, e))
+                continue
+            try:
+                values = self.split_response(response, batch)
+            except ValueError as e:
+                # Most likely a stale length in did_lengths; nothing from this response is trusted
+                logger.warning("Cannot split 0x22 response %s: %s", bytes(response).hex(' '), e)
+                if len(batch) == 1:
+                    results[batch[0]] = e
+                    continue
+                # Read one by one, which learns the current lengths
+                for did in batch:
+                    self.did_lengths.pop(did, None)
+                    work.append(([did], self.uds.send_request(self.build_request([did]))))
+                continue
+            if len(batch) == 1:
+                self.did_lengths[batch[0]] = len(values[batch[0]])
+            for did in batch:
+                if did in values:
+                    results[did] = values[did]
+                    cache.put(did, values[did])
+                else:
+                    results[did] = UDSException.create_exception(0x31)
+        return {did: results[did] for did in dids}
@@ -1,7 +1,10 @@
+import logging
 import queue
 from . import Colors
 from .frame import Frame
 
+logger = logging.getLogger(__name__)
+
 class Ox2E:
 
     def __init__(self, uds_instance):
@@ -16,6 +19,11 @@ class Ox2E:
 
     def main(self):
         if not self.buffer.empty():
-            print("I'm in Ox2E")
+            logger.debug("Handling 0x2E response")
             self.data = self.buffer.get()
+            if len(self.data) >= 3:
+                did = self.data[1] << 8 | self.data[2]
+                self.uds.did_cache.invalidate(did)
+                # The written value may have another length than the one batching relies on
+                self.uds.handlers[0x22].did_lengths.pop(did, None)
             self.uds.added_from_sid(self.data)
\ No newline at end of file
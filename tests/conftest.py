@@ -0,0 +1,66 @@
+from ecupath import UDS, EventManager, SimulatedECU
+import itertools
+import pytest
+import threading
+import time
+
+_bus_names = itertools.count()
+
+
+class MonitoredStack:
+    """
+    A UDS stack with a thread doing what App.monitor does in the GUI, so
+    Futures resolve without anyone driving the stack.
+    """
+
+    def __init__(self, interface, channel, tx_id, rx_id):
+        self.event_manager = EventManager()
+        self.uds = UDS(interface, tx_id, rx_id, channel, 500000, 'standard', self.event_manager)
+        self.uds.can_tp.can.start_receiving()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            self.uds.can_tp.cantp_monitor()
+            self.uds.can_tp.can.can_monitor()
+            time.sleep(0.0005)
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self.uds.close()
+
+
+@pytest.fixture
+def bus():
+    # Loopback buses are process-wide, so every test gets a fresh name
+    return f"test_bus_{next(_bus_names)}"
+
+
+@pytest.fixture
+def ecu_factory():
+    ecus = []
+
+    def create(channel, **kwargs):
+        ecu = SimulatedECU(channel, **kwargs)
+        ecu.start()
+        ecus.append(ecu)
+        return ecu
+    yield create
+    for ecu in ecus:
+        ecu.close()
+
+
+@pytest.fixture
+def stack_factory():
+    stacks = []
+
+    def create(channel, tx_id=0x720, rx_id=0x728, interface='loopback'):
+        stack = MonitoredStack(interface, channel, tx_id, rx_id)
+        stacks.append(stack)
+        return stack.uds
+    yield create
+    for stack in stacks:
+        stack.close()
@@ -0,0 +1,23 @@
+from ecupath import DtcSweep, Loopback
+
+
+def test_sweep_merges_every_ecu(ecu_factory):
+    ecus = []
+    for bus in ('body', 'powertrain'):
+        for i in range(5):
+            ecu_factory(f'test_sweep_{bus}', rx_id=0x600 + i, tx_id=0x680 + i,
+                        dtcs=[(0xC10000 + i, 0x09), (0x012300 + i, 0x2F)])
+            ecus.append({'name': f'{bus}{i}', 'bus': bus, 'tx_id': 0x600 + i, 'rx_id': 0x680 + i})
+    ecus.append({'name': 'missing', 'bus': 'powertrain', 'tx_id': 0x6F0, 'rx_id': 0x6F8})
+    buses = {'body': Loopback('test_sweep_body'), 'powertrain': Loopback('test_sweep_powertrain')}
+    try:
+        report = DtcSweep(buses, ecus, snapshot_record=0xFF, session=0x03).run()
+    finally:
+        for interface in buses.values():
+            interface.close()
+    assert report['dtc_count'] == 20
+    assert report['failed_ecus'] == ['missing']
+    dtcs = report['ecus']['powertrain3']['dtcs']
+    assert [dtc['dtc'] for dtc in dtcs] == ['C10003', '012303']
+    assert dtcs[0]['status'] == 0x09
+    assert 'data' in dtcs[0]['snapshot']
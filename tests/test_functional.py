@@ -0,0 +1,55 @@
+from ecupath.UDSException import RequestOutOfRangeException
+
+ECUS = {0x7E8 + i: 0x7E0 + i for i in range(3)}
+
+
+def create_ecus(bus, ecu_factory):
+    return [ecu_factory(bus, rx_id=tx_id, tx_id=rx_id, functional_id=0x7DF,
+                        dids={0xF190: bytes([0x41 + i]) * (5 if i % 2 else 40)})
+            for i, (rx_id, tx_id) in enumerate(ECUS.items())]
+
+
+def test_collects_every_ecu(bus, ecu_factory, stack_factory):
+    create_ecus(bus, ecu_factory)
+    uds = stack_factory(bus, 0x7E0, 0x7E8)
+    functional = uds.open_functional(ECUS)
+    try:
+        results = functional.request((0x22, 0xF1, 0x90)).result(3)
+    finally:
+        functional.close()
+    assert results == {
+        0x7E8: b'\x62\xF1\x90' + b'A' * 40,
+        0x7E9: b'\x62\xF1\x90' + b'B' * 5,
+        0x7EA: b'\x62\xF1\x90' + b'C' * 40
+    }
+
+
+def test_silent_and_negative_ecus(bus, ecu_factory, stack_factory):
+    ecus = create_ecus(bus, ecu_factory)
+    ecus[1].handlers[0x22] = lambda request: None
+    ecus[2].handlers[0x22] = lambda request: bytes((0x7F, 0x22, 0x31))
+    uds = stack_factory(bus, 0x7E0, 0x7E8)
+    functional = uds.open_functional(ECUS)
+    try:
+        results = functional.request((0x22, 0xF1, 0x90)).result(3)
+    finally:
+        functional.close()
+    assert set(results) == {0x7E8, 0x7EA}
+    assert isinstance(results[0x7EA], RequestOutOfRangeException)
+
+
+def test_shared_id_keeps_physical_client_working(bus, ecu_factory, stack_factory):
+    ecus = create_ecus(bus, ecu_factory)
+    ecus[0].handlers[0x31] = lambda request: bytes((0x7F, 0x31, 0x31))
+    uds = stack_factory(bus, 0x7E0, 0x7E8)
+    uds.start_session().result(2)
+    functional = uds.open_functional(ECUS)
+    try:
+        results = functional.request((0x31, 0x01, 0xFF, 0x00)).result(3)
+        assert isinstance(results[0x7E8], RequestOutOfRangeException)
+        # The functional NRC belongs to the functional request, not to the physical session
+        assert uds.session_started
+        assert uds.send_request((0x22, 0xF1, 0x90)).result(2) == b'\x62\xF1\x90' + b'A' * 40
+    finally:
+        functional.close()
+    assert uds.send_request((0x22, 0xF1, 0x90)).result(2) == b'\x62\xF1\x90' + b'A' * 40
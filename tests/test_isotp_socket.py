@@ -0,0 +1,55 @@
+import os
+import pytest
+import socket
+import threading
+
+# Needs a vcan netdev and the can-isotp module:
+#   ip link add dev vcan0 type vcan && ip link set up vcan0 && modprobe can-isotp
+CHANNEL = os.environ.get('ISOTP_TEST_CHANNEL', 'vcan0')
+
+
+def isotp_available(channel):
+    try:
+        sock = socket.socket(socket.AF_CAN, socket.SOCK_DGRAM, socket.CAN_ISOTP)
+    except (AttributeError, OSError):
+        return False
+    with sock:
+        try:
+            sock.bind((channel, 0x7E8, 0x7E0))
+        except OSError:
+            return False
+    return True
+
+
+pytestmark = pytest.mark.skipif(not isotp_available(CHANNEL),
+                                reason=f"kernel CAN_ISOTP on {CHANNEL} is not available")
+
+
+@pytest.fixture
+def ecu_socket():
+    # The ECU side is a plain kernel ISO-TP socket with the IDs swapped
+    sock = socket.socket(socket.AF_CAN, socket.SOCK_DGRAM, socket.CAN_ISOTP)
+    sock.bind((CHANNEL, 0x7E0, 0x7E8))
+    sock.settimeout(2)
+    yield sock
+    sock.close()
+
+
+def serve(sock, responses):
+    def run():
+        for response in responses:
+            sock.recv(4095)
+            sock.send(response)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_round_trips_through_the_kernel(ecu_socket, stack_factory):
+    vin = bytes(range(100))
+    server = serve(ecu_socket, [b'\x50\x03\x00\x32\x13\x88', b'\x62\xF1\x90' + vin, b'\x6E\xF1\x90'])
+    uds = stack_factory(CHANNEL, 0x7E0, 0x7E8, interface='socketcan_isotp')
+    assert uds.start_session().result(2)[0] == 0x50
+    assert uds.send_request((0x22, 0xF1, 0x90)).result(2) == b'\x62\xF1\x90' + vin
+    assert uds.send_request(bytes((0x2E, 0xF1, 0x90)) + vin).result(2) == b'\x6E\xF1\x90'
+    server.join(2)
@@ -0,0 +1,51 @@
+from ecupath import Frame
+from ecupath.UDSException import RequestOutOfRangeException
+import pytest
+
+
+def test_single_frame_round_trip(bus, ecu_factory, stack_factory):
+    ecu_factory(bus, dids={0xF18C: b'SN1'})
+    uds = stack_factory(bus)
+    assert uds.start_session().result(2)[0] == 0x50
+    assert uds.send_request((0x22, 0xF1, 0x8C)).result(2) == b'\x62\xF1\x8CSN1'
+
+
+def test_multi_frame_round_trip(bus, ecu_factory, stack_factory):
+    vin = b'WDB1234561A123456'
+    ecu_factory(bus, dids={0xF190: vin})
+    uds = stack_factory(bus)
+    uds.start_session().result(2)
+    assert uds.send_request((0x22, 0xF1, 0x90)).result(2) == b'\x62\xF1\x90' + vin
+
+
+def test_multi_frame_request(bus, ecu_factory, stack_factory):
+    ecu = ecu_factory(bus)
+    uds = stack_factory(bus)
+    uds.start_session().result(2)
+    value = bytes(range(100))
+    assert uds.send_request(bytes((0x2E, 0x01, 0x02)) + value).result(2) == b'\x6E\x01\x02'
+    assert ecu.dids[0x0102] == value
+
+
+def test_escape_first_frame(bus, ecu_factory, stack_factory):
+    # Above 4095 bytes the ECU has to use the 32-bit FF_DL escape sequence
+    value = bytes(i & 0xFF for i in range(5000))
+    ecu_factory(bus, dids={0x0100: value})
+    uds = stack_factory(bus)
+    uds.start_session().result(2)
+    assert len(value) + 3 > Frame.MAX_FF_DL
+    assert uds.send_request((0x22, 0x01, 0x00)).result(5) == b'\x62\x01\x00' + value
+
+
+def test_negative_response(bus, ecu_factory, stack_factory):
+    ecu_factory(bus)
+    uds = stack_factory(bus)
+    uds.start_session().result(2)
+    with pytest.raises(RequestOutOfRangeException):
+        uds.send_request((0x22, 0x12, 0x34)).result(2)
+
+
+def test_timeout_without_ecu(bus, stack_factory):
+    uds = stack_factory(bus)
+    with pytest.raises(TimeoutError):
+        uds.start_session().result(2)
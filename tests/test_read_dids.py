@@ -0,0 +1,69 @@
+from ecupath.UDSException import RequestOutOfRangeException
+
+DIDS = {0xF100 + i: bytes([i]) * (1 + i % 20) for i in range(60)}
+
+
+def test_batches_once_lengths_are_known(bus, ecu_factory, stack_factory):
+    ecu = ecu_factory(bus, dids=DIDS)
+    uds = stack_factory(bus)
+    uds.start_session().result(2)
+    # Unknown lengths are learned one DID per request
+    assert uds.read_dids(DIDS, timeout=5, use_cache=False) == DIDS
+    handled = ecu.requests_handled
+    assert uds.read_dids(DIDS, timeout=5, use_cache=False) == DIDS
+    assert ecu.requests_handled - handled == 1
+
+
+def test_splits_batches_by_response_length(bus, ecu_factory, stack_factory):
+    ecu = ecu_factory(bus, dids=DIDS)
+    uds = stack_factory(bus)
+    uds.start_session().result(2)
+    uds.read_dids(DIDS, timeout=5, use_cache=False)
+    uds.handlers[0x22].max_response_length = 100
+    handled = ecu.requests_handled
+    assert uds.read_dids(DIDS, timeout=5, use_cache=False) == DIDS
+    assert ecu.requests_handled - handled > 1
+
+
+def test_unsupported_did_is_isolated(bus, ecu_factory, stack_factory):
+    ecu_factory(bus, dids=DIDS)
+    uds = stack_factory(bus)
+    uds.start_session().result(2)
+    uds.read_dids(DIDS, timeout=5, use_cache=False)
+    result = uds.read_dids([0xF101, 0x1234, 0xF102], timeout=5, use_cache=False)
+    assert result[0xF101] == DIDS[0xF101] and result[0xF102] == DIDS[0xF102]
+    assert isinstance(result[0x1234], RequestOutOfRangeException)
+
+
+def test_stale_length_is_read_again(bus, ecu_factory, stack_factory):
+    ecu = ecu_factory(bus, dids={0xF190: b'WDB1234561A123456', 0xF18C: b'SN1'})
+    uds = stack_factory(bus)
+    uds.start_session().result(2)
+    uds.read_dids([0xF190, 0xF18C], timeout=5, use_cache=False)
+    ecu.dids[0xF18C] = b'SN12345'
+    result = uds.read_dids([0xF190, 0xF18C], timeout=5, use_cache=False)
+    assert result == {0xF190: b'WDB1234561A123456', 0xF18C: b'SN12345'}
+    assert uds.handlers[0x22].did_lengths[0xF18C] == 7
+
+
+def test_identification_dids_are_cached(bus, ecu_factory, stack_factory):
+    ecu = ecu_factory(bus, dids={0xF190: b'WDB1234561A123456', 0x0101: b'\x10'})
+    uds = stack_factory(bus)
+    uds.start_session().result(2)
+    uds.read_dids([0xF190, 0x0101], timeout=5)
+    handled = ecu.requests_handled
+    assert uds.read_dids([0xF190], timeout=5) == {0xF190: b'WDB1234561A123456'}
+    assert ecu.requests_handled == handled
+    uds.read_dids([0x0101], timeout=5)
+    assert ecu.requests_handled == handled + 1
+    assert uds.did_cache.statistics()['misses'] == 1
+
+
+def test_write_invalidates_cache(bus, ecu_factory, stack_factory):
+    ecu_factory(bus, dids={0xF190: b'WDB1234561A123456', 0xF18C: b'SN1'})
+    uds = stack_factory(bus)
+    uds.start_session().result(2)
+    uds.read_dids([0xF190, 0xF18C], timeout=5)
+    uds.send_request(bytes((0x2E, 0xF1, 0x8C)) + b'SN0006').result(2)
+    assert uds.read_dids([0xF190, 0xF18C], timeout=5) == {0xF190: b'WDB1234561A123456', 0xF18C: b'SN0006'}
+    assert uds.did_cache.statistics()['invalidations'] == 1
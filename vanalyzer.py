@@ -4,6 +4,7 @@ import json
 from datetime import datetime
 from app import App
 from ecupath import EventManager, Frame, get_hardware_interface, Tx, Rx, UDS  # Use absolute imports
+from ecupath import log
 
 
 class Api:
@@ -93,11 +94,12 @@ class Api:
         return content
 
     def update_terminal_output(self, data):
-        if Frame.negative_response(data[1]):
-            data[0] = 'error'
+        direction, frame = data
+        if Frame.negative_response(frame.data):
+            direction = 'error'
 
-        data[1] = Frame.hex(data[1])
-        json_name = json.dumps(data)  # Properly escape the string
+        # Hex strings are only built here, for the page
+        json_name = json.dumps([direction, Frame.hex(frame.data)])  # Properly escape the string
         window.evaluate_js(f"window.updateTerminalStack({json_name});")
 
     def start_session(self):
@@ -111,12 +113,20 @@ class Api:
 
     def update_output_stack(self, data):
         print(data)
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = Frame.hex(data)
         json_name = json.dumps(data)  # Properly escape the string
         window.evaluate_js(f"window.updateOutputStack({json_name});")
 
     def send_request(self, request_data):
         self.uds.send_request(self.process_request_data(request_data))
 
+    def read_dids(self, dids):
+        # Snapshot read for the page: hex DID strings in, hex data (or the error) out
+        values = self.uds.read_dids([int(did, 16) for did in dids], timeout=self.uds.p2_star_timer)
+        return {f"{did:04X}": str(value) if isinstance(value, Exception) else Frame.hex(value)
+                for did, value in values.items()}
+
     def process_request_data(self, request_data):
         sid = int(request_data['sid'], 16)  # Convert SID to integer from hexadecimal
         request = [sid]  # Start with SID in the request
@@ -158,6 +168,7 @@ class Api:
 
 
 if __name__ == '__main__':
+    log.configure()
     api = Api()
     app_path = os.path.abspath('vanalyzer/dist/index.html')
     window = webview.create_window('JS API example', url=app_path, js_api=api)